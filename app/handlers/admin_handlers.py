@@ -1,26 +1,28 @@
+import asyncio
+import csv
+import io
+import logging
 from dotenv import load_dotenv
-from aiogram import Dispatcher, Router, F
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram import Bot, Router, F
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from aiogram.filters import Command
 from aiogram.types import Message
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 
-from app.sql_database.User import UserDatabase
+from app.sql_database.User import db_user
 
 load_dotenv(override=True)
 
 class AuthStates(StatesGroup):
     waiting_for_tgname = State()
+    waiting_for_users_file = State()
 
 LOG_DIR = "./data/bot_logs"
-
-db_user = UserDatabase()
+# максимальный размер файла для импорта пользователей
+MAX_IMPORT_FILE_SIZE = 10 * 1024 * 1024
 
 router = Router()
-storage = MemoryStorage()
-dispatcher = Dispatcher(storage=storage)
 
 admin_keyboard = ReplyKeyboardMarkup(
     keyboard=[
@@ -34,7 +36,7 @@ admin_keyboard = ReplyKeyboardMarkup(
 @router.message(Command(commands=["admin"]))
 async def admin_command(message: Message):
     user_id = message.from_user.id
-    if user_id in db_user.get_admins_id():
+    if await db_user.is_admin(user_id):
         await message.answer("Административное меню:", 
                              reply_markup=admin_keyboard)
     else:
@@ -43,44 +45,129 @@ async def admin_command(message: Message):
 @router.message(F.text == "👤 Стать дежурным админом")
 async def update_vector_database(message: Message):
     user_id = message.from_user.id
-    if not db_user.exists(user_id):
+    if not await db_user.exists(user_id):
         await message.answer("Вы не зарегистрированы.")
         return
 
-    if user_id not in db_user.get_admins_id():
+    if not await db_user.is_admin(user_id):
         await message.answer("Эта команда доступна только ADMIN-пользователю.")
         return
     
-    db_user.set_access_rights(user_id, "duty_admin")
+    await db_user.set_access_rights(user_id, "duty_admin")
     await message.answer("Теперь вы дежурный админ. Все запросы будут поступать вам.")
 
 @router.message(F.text == "Добавить админа")
 async def add_admin(message: Message, state: FSMContext):
+    if not await db_user.is_admin(message.from_user.id):
+        await message.answer("У вас нет доступа к этой команде.")
+        return
     await message.answer("Введите @telegram_name нового админа")
     await state.set_state(AuthStates.waiting_for_tgname)
 
 @router.message(AuthStates.waiting_for_tgname)
 async def handle_new_admin(message: Message, state: FSMContext):
-    tg_name = message.text.strip()
-    user_id = db_user.get_user_id_by_tgname(tg_name.replace('@', ''))
+    await state.clear()
+    # права могли забрать, пока админ вводил ник
+    if not await db_user.is_admin(message.from_user.id):
+        await message.answer("У вас нет доступа к этой команде.")
+        return
+    tg_name = (message.text or "").strip()
+    user_id = await db_user.get_user_id_by_tgname(tg_name.replace('@', ''))
     if user_id:
-        db_user.set_access_rights(user_id, 'admin')
+        await db_user.set_access_rights(user_id, 'admin')
         await message.answer("Новый админ подтвержден")
     else:
         await message.answer("Нет такого пользователя")
 
 @router.message(Command(commands=["show_duty_admin"]))
 async def cmd_show_duty_admin(message: Message):
-    duty_id = db_user.get_duty_admin_id()
+    duty_id = await db_user.get_duty_admin_id()
     if duty_id == 0:
         await message.answer("Дежурный админ не назначен.")
         return
     
-    d_data = db_user.get_user(duty_id)
-    tg_link = db_user.get_user_telegram_link(duty_id)
+    d_data = await db_user.get_user(duty_id)
+    tg_link = await db_user.get_user_telegram_link(duty_id)
     text = (
         f"👨‍💼 Текущий дежурный администратор:\n\n"
         f'👤 Имя: {d_data["username"]}\n'
         f'📱 Telegram: {tg_link}\n'
     )
-    await message.answer(text)
\ No newline at end of file
+    await message.answer(text)
+
+# ============ ИМПОРТ ПОЛЬЗОВАТЕЛЕЙ ===================
+
+def parse_users_file(data: bytes, filename: str) -> tuple:
+    """
+    Разбирает csv/xlsx со столбцами user_id, ФИО, telegram-ник (заголовок необязателен).
+    Возвращает (пользователи, номера некорректных строк)
+    """
+    if filename.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+        workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(max_col=3, values_only=True)
+    else:
+        rows = csv.reader(io.StringIO(data.decode("utf-8-sig")))
+
+    users = []
+    bad_lines = []
+    for line, row in enumerate(rows, start=1):
+        row = list(row) + [None] * (3 - len(row))
+        user_id, username, telegram_username = row[:3]
+        user_id = str(user_id).strip() if user_id is not None else ""
+        if user_id.endswith(".0"):
+            user_id = user_id[:-2]
+        if not user_id.isdigit() or not username:
+            # первая строка может быть заголовком
+            if line != 1 and any(row):
+                bad_lines.append(line)
+            continue
+        telegram_username = str(telegram_username).strip().lstrip("@") if telegram_username else None
+        users.append((int(user_id), str(username).strip(), telegram_username))
+    return users, bad_lines
+
+@router.message(Command(commands=["import_users"]))
+async def cmd_import_users(message: Message, state: FSMContext):
+    if not await db_user.is_admin(message.from_user.id):
+        await message.answer("У вас нет доступа к этой команде.")
+        return
+    await message.answer("Отправьте csv или xlsx файл со столбцами: user_id, ФИО, telegram-ник")
+    await state.set_state(AuthStates.waiting_for_users_file)
+
+@router.message(AuthStates.waiting_for_users_file)
+async def handle_users_file(message: Message, bot: Bot, state: FSMContext):
+    # права могли забрать, пока админ готовил файл
+    if not await db_user.is_admin(message.from_user.id):
+        await state.clear()
+        await message.answer("У вас нет доступа к этой команде.")
+        return
+    document = message.document
+    if document is None:
+        await message.answer("Ожидается файл csv или xlsx. Для выхода используйте /end")
+        return
+    if document.file_size and document.file_size > MAX_IMPORT_FILE_SIZE:
+        await message.answer("Файл слишком большой")
+        return
+
+    buffer = io.BytesIO()
+    await bot.download(document.file_id, destination=buffer)
+    try:
+        users, bad_lines = await asyncio.to_thread(
+            parse_users_file, buffer.getvalue(), document.file_name or ""
+        )
+        inserted = await db_user.insert_many(users)
+    except Exception as e:
+        logging.error(f"Ошибка при импорте пользователей: {e}")
+        await message.answer("Не удалось импортировать пользователей из файла.")
+        return
+
+    text = (
+        f"✅ Зарегистрировано: {len(inserted)}\n"
+        f"⏭ Уже были в базе: {len(users) - len(inserted)}\n"
+    )
+    if bad_lines:
+        text += f"❌ Некорректные строки: {', '.join(map(str, bad_lines[:50]))}"
+        if len(bad_lines) > 50:
+            text += f" и еще {len(bad_lines) - 50}"
+    await message.answer(text)
+    await state.clear()
@@ -1,24 +1,32 @@
-from aiogram import Bot, Dispatcher, Router, types, F
+from aiogram import Bot, Router, types, F
 from aiogram.types import Message
 from aiogram.types import BufferedInputFile 
 from aiogram.filters import Command
 from aiogram.enums.parse_mode import ParseMode
-import base64
 import aiohttp
 import asyncio
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton
 import json
+import logging
 import os
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
-from aiogram.fsm.storage.memory import MemoryStorage
 from datetime import datetime
-import pandas as pd
+from functools import partial
 from dotenv import load_dotenv, set_key, find_dotenv
 
 #from googleapiclient.discovery import build
 
-from app.sql_database.User import UserDatabase
+from app.sql_database.User import db_user
+from app.services.assets import assets
+from app.services.log_writer import user_log_writer
+from app.services.numerology_client import NumerologyClient, BackendError
+from app.services.jobs import JobQueue, QueueFull
+from app.services.result_cache import result_cache
+from app.services.sender import sender
+from app.services.questionnaire import (
+    QuestionnaireTooLarge, download_questionnaire, read_questionnaire, save_user_info, fill_mapping
+)
 
 load_dotenv(override=True)
 
@@ -35,11 +43,7 @@ LOG_DIR = "./data/bot_logs"
 # GOOGLE_SHEET = os.getenv("GOOGLE_SHEET")
 # RANGE_NAME = "ОС пользователей!A2:I"
 
-db_user = UserDatabase()
-
 router = Router()
-storage = MemoryStorage()
-dispatcher = Dispatcher(storage=storage)
 
 def update_env_variable(key, value):
     dotenv_path = find_dotenv()
@@ -59,9 +63,7 @@ async def get_user_id(message: Message):
 def get_welcome_message(user_name):
     if not user_name:
         user_name = "коллега"
-    with open("app/bot_messages/welcome.txt", encoding="utf-8") as f:
-        welcome = f.read()
-    return welcome.format(user_name=user_name)
+    return assets.render("welcome", user_name=user_name)
 
 functionality = ReplyKeyboardMarkup(
     keyboard=[
@@ -90,11 +92,7 @@ def log_user_action(user_id, action, details=None, error=None):
         "details": details,
         "error": str(error) if error else None,
     }
-    user_log_file = os.path.join(LOG_DIR, f"user_{user_id}.log")
-    with open(user_log_file, "a", encoding="utf-8") as f:
-        f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-
-user_state = {}
+    user_log_writer.write(user_id, json.dumps(log_entry, ensure_ascii=False) + "\n")
 
 # ============ START ===============
 @router.message(Command(commands=["start"]))
@@ -102,7 +100,7 @@ async def start_command(message: Message):
     user_id = message.from_user.id
     user_name = message.from_user.first_name or ""
     
-    if not db_user.exists(user_id):
+    if not await db_user.exists(user_id):
         await message.answer(
             "Вы не зарегистрированы в системе. Используйте команду /auth, чтобы зарегистрироваться."
         )
@@ -139,101 +137,123 @@ async def choose_structure(message: Message):
 @router.message(F.text == "Сеанс нумерологии")
 async def choose_structure(message: Message, state: FSMContext):
     user_id = message.from_user.id
-    user_state[user_id] = "structure"
+    await state.update_data(user_state="structure")
     log_user_action(user_id, "start_numerology")
-    with open("app/bot_messages/start_numerology.txt") as f:
-        start_numerology = f.read()
-    
-    excel_path = "app/temp/questionnaire.xlsx"
-    with open(excel_path, "rb") as excel_file:
-        await message.answer_document(
-            document=types.BufferedInputFile(
-                excel_file.read(),
-                filename="Опрос_нумерология.xlsx"
-            ),
-            caption=start_numerology,
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=types.ReplyKeyboardRemove()
-        )
+    sent = await message.answer_document(
+        document=assets.document("questionnaire"),
+        caption=assets.render("start_numerology"),
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=types.ReplyKeyboardRemove()
+    )
+    if sent.document:
+        assets.remember_file_id("questionnaire", sent.document.file_id)
     await state.set_state(ConfigStates.numerology)
 
-def fill_mapping(user_info: pd.DataFrame):
-     json_data = {
-        "base": {},
-        "base_optional": {},
-        "desire": "",
-        "desire_optional": {},
-        "optional": {}
-    }
-     with open("./data/numerology/field_mapping.json") as f:
-        field_mapping = json.load(f)
-        for i, row in user_info.iterrows():
-            if len(row) < 2:  # Пропускаем строки без значений
-                continue
-            
-            field_name = row[0]
-            field_value = row[1]
-            
-            if field_name in field_mapping:
-                section, key = field_mapping[field_name]
-                # Обработка особых случаев
-                if field_name == "Дата рождения" or field_name == "Дата консультирования":
-                    # Преобразуем дату в ISO формат
-                    try:
-                        # Если дата в формате DD.MM.YYYY
-                        if isinstance(field_value, str) and '.' in field_value:
-                            day, month, year = field_value.split('.')
-                            field_value = f"{year}-{month}-{day}"
-                        # Если дата уже как объект datetime
-                        elif isinstance(field_value, datetime):
-                            field_value = field_value.strftime("%Y-%m-%d")
-                    except Exception:
-                        # Если не удалось преобразовать, оставляем как есть
-                        pass
-                if key == "None":  # Для поля "desire", которое не вложенный объект
-                    json_data[section] = field_value
-                else:
-                    json_data[section][key] = field_value
-        return json_data
+async def process_questionnaire(chat_id: int, user_id: int, user_info: dict,
+                                numerology_client: NumerologyClient):
+    """
+    Задача очереди: анализ анкеты на бэкенде и отправка результата пользователю
+    """
+    cache_key = result_cache.key(user_info)
+    cached = await result_cache.get(cache_key)
+    if cached is not None:
+        log_user_action(user_id, "num_result_from_cache")
+        pdf_binary, link = cached
+    else:
+        await sender.send_message(chat_id, "Анкета в обработке")
+        try:
+            result = await numerology_client.analyze_user(user_info)
+        except BackendError as e:
+            await sender.send_message(chat_id, "Ошибка! " + e.text[:1000],
+                                      reply_markup=functionality)
+            return
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log_user_action(user_id, "numerology_backend_error", error=e)
+            await sender.send_message(chat_id, "Сервис нумерологии сейчас недоступен, попробуйте позже.",
+                                      reply_markup=functionality)
+            return
+        pdf_binary, link = result.pdf, result.link
+        # кэш - только ускорение: ошибка записи на диск не должна помешать отправить результат
+        try:
+            await result_cache.put(cache_key, pdf_binary, link)
+        except Exception as e:
+            logging.warning(f"Не удалось сохранить результат в кэш: {e}")
+    caption=f"""Хотите запустить связанный сеанс?"""
+    if link and await db_user.is_admin(user_id):
+        caption = f"<a href='{link}'>Гугл таблица</a>\n\n" + caption
+    document = BufferedInputFile(
+        file=pdf_binary,
+        filename="Результат нумерология.pdf"
+    )
+    await sender.send_document(
+        chat_id,
+        document=document,
+        caption=caption,
+        parse_mode=ParseMode.HTML,
+        reply_markup=connected_sessions)
+    log_user_action(user_id, "num_result_sent")
+
+async def notify_questionnaire_failed(chat_id: int, user_id: int, error: Exception):
+    """
+    Задача анкеты упала или не уложилась в таймаут - пользователь не должен ждать вечно
+    """
+    log_user_action(user_id, "numerology_job_failed", error=repr(error))
+    await sender.send_message(chat_id, "Не удалось обработать анкету, попробуйте отправить ее еще раз позже.",
+                              reply_markup=functionality)
+
+async def notify_queue_position(chat_id: int, position: int):
+    # статус - фоновый: не обгоняет результаты других пользователей, устаревший заменяется новым
+    if position == 1:
+        await sender.send_status(chat_id, "Ваша анкета следующая в очереди.", key="queue_position")
+    else:
+        await sender.send_status(chat_id, f"Ваша позиция в очереди: {position}", key="queue_position")
 
 @router.message(ConfigStates.numerology)
-async def get_questionnaire(message: Message, bot: Bot, state: FSMContext):
+async def get_questionnaire(message: Message, bot: Bot, state: FSMContext,
+                            numerology_client: NumerologyClient, job_queue: JobQueue):
     user_id = message.from_user.id
     log_user_action(user_id, "got_num_questionnaire")
-    await bot.download(message.document.file_id, destination="app/temp/questionnaire.xlsx")
-    questionnaire = pd.read_excel("app/temp/questionnaire.xlsx")
+    if job_queue.has_job(user_id):
+        position = job_queue.position(user_id)
+        text = "Ваша анкета уже обрабатывается, дождитесь результата."
+        if position:
+            text = f"Ваша анкета уже в очереди, позиция: {position}."
+        await message.answer(text)
+        return
+    if message.document is None:
+        await message.answer("Отправьте заполненный опросник файлом.")
+        return
+    try:
+        buffer = await download_questionnaire(bot, message.document)
+        questionnaire = await asyncio.to_thread(read_questionnaire, buffer)
+    except QuestionnaireTooLarge:
+        await message.answer("Файл слишком большой, отправьте заполненный опросник из шаблона.")
+        return
+    except Exception as e:
+        log_user_action(user_id, "bad_num_questionnaire", error=e)
+        await message.answer("Не удалось прочитать опросник, проверьте, что это xlsx-файл из шаблона.")
+        return
     user_info = fill_mapping(questionnaire)
-    with open("./data/numerology/user_info.json", 'w') as f:
-        json.dump(user_info, f, ensure_ascii=False, indent=4)
-
-    await message.answer("Спасибо, анкета в обработке")
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-            url=f"http://0.0.0.0:{os.getenv('BACKEND_PORT')}/numerology/user/",
-            json=user_info) as num_answer:
-            if num_answer.status != 200:  # or any other success code like 201
-                error_text = await num_answer.text()
-                await message.answer("Ошибка! " + error_text[:1000],
-                                reply_markup=functionality)
-            else:
-                num_answer = await num_answer.json()
-                user_id = message.from_user.id
-                caption=f"""Хотите запустить связанный сеанс?"""
-                if user_id in db_user.get_admins_id():
-                    caption = f"<a href='{num_answer['link']}'>Гугл таблица</a>\n\n" + caption
-                print('GOT ANSWER')
-                pdf_binary = base64.b64decode(num_answer['pdf'])
-                document = BufferedInputFile(
-                    file=pdf_binary,
-                    filename="Результат нумерология.pdf"
-                )
-                await asyncio.wait_for(message.answer_document(
-                    document=document,
-                    caption=caption,
-                    parse_mode=ParseMode.HTML,
-                    reply_markup=connected_sessions),
-                    timeout=50000)
-                await state.clear()
+    await save_user_info(user_info, user_id, message.message_id)
+
+    try:
+        chat_id = message.chat.id
+        position = job_queue.submit(user_id, process_questionnaire,
+                                    chat_id, user_id, user_info, numerology_client,
+                                    on_error=partial(notify_questionnaire_failed, chat_id, user_id),
+                                    on_position=partial(notify_queue_position, chat_id))
+    except QueueFull:
+        await message.answer("Сейчас слишком много анкет в обработке, попробуйте позже.",
+                             reply_markup=functionality)
+        return
+    # подтверждение ставится в ту же очередь отправки до первого await, иначе воркер
+    # успеет отправить "Анкета в обработке" или позицию раньше него
+    text = "Спасибо, анкета принята"
+    if position > 1:
+        text = f"Спасибо, анкета принята. Ваша позиция в очереди: {position}"
+    accepted = sender.submit("send_message", chat_id, coalesce=True, text=text)
+    await state.clear()
+    await accepted
 
 # ============ СЕАНС ХИРОМАНТИИ ===================
 
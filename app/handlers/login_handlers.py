@@ -1,23 +1,27 @@
 from dotenv import load_dotenv, set_key, find_dotenv
-from aiogram import Bot, Dispatcher, Router, types, F
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram import Bot, Router, types, F
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import Message, CallbackQuery
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+import asyncio
 import logging
+from functools import partial
 
-from app.sql_database.User import UserDatabase
+from app.sql_database.User import db_user
+from app.services.sender import MAX_MESSAGE_LENGTH, sender
 
 load_dotenv(override=True)
 
 LOG_DIR = "./data/bot_logs"
-
-db_user = UserDatabase()
+# пользователей на одной странице /show_db
+SHOW_DB_PAGE_SIZE = 20
+# ФИО и ник - свободный текст, на странице обрезаются до этой длины
+SHOW_DB_FIELD_LENGTH = 200
 
 router = Router()
-storage = MemoryStorage()
-dispatcher = Dispatcher(storage=storage)
 
 class AuthStates(StatesGroup):
     waiting_for_username = State()
@@ -30,7 +34,7 @@ async def auth(message: Message, state: FSMContext):
     """
     user_id = message.from_user.id
     print(user_id)
-    if db_user.exists(user_id):
+    if await db_user.exists(user_id):
         # if db_user.is_approved(user_id):
         await message.answer("Вы уже зарегистрированы и одобрены администратором. Можете пользоваться ботом.")
     # else:
@@ -44,8 +48,8 @@ async def auth(message: Message, state: FSMContext):
 async def handle_user(message: Message, state: FSMContext):
     user_id = message.from_user.id
     
-    # if user_id in db_user.get_admins_id():
-        # user_data = db_user.get_user(user_id)
+    # if await db_user.is_admin(user_id):
+        # user_data = await db_user.get_user(user_id)
         # if user_data.get("access_rights") == "duty_admin":
         #     await message.answer(
         #         "Вы зарегистрированы как администратор системы!\n"
@@ -59,7 +63,7 @@ async def handle_user(message: Message, state: FSMContext):
     
     username = message.text.strip()
     tg_link = message.from_user.username
-    db_user.insert(user_id=user_id, 
+    await db_user.insert(user_id=user_id, 
                     username=username,
                     telegram_username=tg_link)
     await message.answer(
@@ -68,41 +72,36 @@ async def handle_user(message: Message, state: FSMContext):
             )
 
     # ========== Отправка уведомления деж админу =============
-    # duty_admin_id = db_user.get_duty_admin_id()
-    # admin_list = [duty_admin_id] if duty_admin_id else db_user.get_admins_id()
-    # admin_text = (
-    # f"📨 Запрос на доступ\n\n"
-    # f"👤 Пользователь: {username}\n"
-    # f"📱 Telegram: @{tg_link}\n"
-    # f"🆔 ID: {user_id}\n\n"
-    # " Пользователь запросил доступ. Для одобрения используйте команду:\n"
-    # "👉 `/approve <ID>`"
-    # )
+    duty_admin_id = await db_user.get_duty_admin_id()
+    admin_list = [duty_admin_id] if duty_admin_id else await db_user.get_admins_id()
+    admin_text = (
+    f"📨 Новый пользователь\n\n"
+    f"👤 Пользователь: {username}\n"
+    f"📱 Telegram: @{tg_link}\n"
+    f"🆔 ID: {user_id}"
+    )
 
-    # for admin_id in admin_list:
-    #     try:
-    #         await message.bot.send_message(admin_id, admin_text)
-    #     except Exception as e:
-    #         logging.error(f"Ошибка при отправке уведомления админу {admin_id}: {e}")
-    # await state.clear()
+    # рассылка идет через общую очередь с лимитами Telegram, хендлер ее не ждет
+    for admin_id, future in zip(admin_list, sender.broadcast(admin_list, admin_text)):
+        future.add_done_callback(partial(log_notification_error, admin_id))
+    await state.clear()
+
+def log_notification_error(admin_id: int, future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logging.error(f"Ошибка при отправке уведомления админу {admin_id}: {future.exception()}")
 
 @router.message(Command(commands=["approve"]))
 async def cmd_approve(message: Message):
     user_id = message.from_user.id
 
-    if not db_user.exists(user_id):
-        await message.answer("Пользователь не найден. Вас нет в системе")
+    if not await db_user.is_admin(user_id):
+        await message.answer("У вас нет прав на выполнение этой команды.")
         return
-    
-    # user_data = db_user.get_user(user_id)
-    # if user_data.get("access_rights") not in ("duty_admin", "admin") and user_id not in ADMINS:
-    #     await message.answer("У вас нет прав на выполнение этой команды.")
-    #     return
 
     parts = message.text.split()
-    # if len(parts) < 2:
-    #     await message.answer("Используйте: /approve <ID>")
-    #     return
+    if len(parts) < 2:
+        await message.answer("Используйте: /approve <ID>")
+        return
 
     target_user_id = parts[1]
     if not target_user_id.isdigit():
@@ -110,13 +109,13 @@ async def cmd_approve(message: Message):
         return
 
     target_user_id = int(target_user_id)
-    if not db_user.exists(target_user_id):
+    if not await db_user.exists(target_user_id):
         await message.answer(f"Пользователя с id={target_user_id} нет в Базе данных")
         return
 
-    db_user.approve_user(target_user_id)
-    target_user_data = db_user.get_user(target_user_id)
-    tg_link = db_user.get_user_telegram_link(target_user_id)
+    await db_user.approve_user(target_user_id)
+    target_user_data = await db_user.get_user(target_user_id)
+    tg_link = await db_user.get_user_telegram_link(target_user_id)
 
     # await message.answer(
     # f"""
@@ -140,36 +139,35 @@ async def cmd_approve(message: Message):
 async def cmd_delete_user(message: Message):
     user_id = message.from_user.id
 
-    user_data = db_user.get_user(user_id)
-    # if not db_user.exists(user_id) or user_data.get("access_rights") != "duty_admin":
-        # await message.answer("У вас нет прав на выполнение этой команды.")
-    return   
-    
+    # только admin / duty_admin и ADMINS, обычная регистрация прав не дает
+    if not await db_user.is_admin(user_id):
+        await message.answer("У вас нет прав на выполнение этой команды.")
+        return
+
     parts = message.text.split()
     if len(parts) < 2:
         await message.answer("Некорректная команда. Используйте: /delete_user <ID1> <ID2> ...")
         return
     
     target_user_ids = []
+    bad_ids = []
     for user_id_str in parts[1:]:
         if user_id_str.isdigit():
             target_user_ids.append(int(user_id_str))
         else:
-            await message.answer(f"Некорректный ID: {user_id_str}")
-
-    invalid_ids = []
-    deleted_ids = []
+            bad_ids.append(user_id_str)
+    if bad_ids:
+        await message.answer(f'Некорректные ID: {", ".join(bad_ids)}')
+    if not target_user_ids:
+        return
 
-    for target_user_id in target_user_ids:
-        if not db_user.exists(target_user_id):
-            invalid_ids.append(target_user_id)
-        else:
-            try:
-                db_user.delete(target_user_id)
-                deleted_ids.append(target_user_id)
-            except Exception as e:
-                logging.error(f"Ошибка при удалении пользователя {target_user_id}: {e}")
-                invalid_ids.append(target_user_id)
+    try:
+        deleted_ids = await db_user.delete_many(target_user_ids)
+    except Exception as e:
+        logging.error(f"Ошибка при удалении пользователей {target_user_ids}: {e}")
+        deleted_ids = []
+    deleted_set = set(deleted_ids)
+    invalid_ids = [i for i in dict.fromkeys(target_user_ids) if i not in deleted_set]
 
     response = ""
     if deleted_ids:
@@ -179,36 +177,95 @@ async def cmd_delete_user(message: Message):
 
     await message.answer(response)
     
+class ShowDbPage(CallbackData, prefix="show_db"):
+    backward: bool
+    cursor: int
+
+def shorten(value: str, length: int = SHOW_DB_FIELD_LENGTH) -> str:
+    return value if len(value) <= length else value[:length - 1] + "…"
+
+def size(value: str) -> int:
+    # Telegram считает длину в UTF-16: эмодзи занимают по несколько позиций
+    return len(value.encode("utf-16-le")) // 2
+
+def render_users_page(users: list, has_prev: bool, has_next: bool, backward: bool = False) -> tuple:
+    """
+    Текст и inline-клавиатура одной страницы /show_db.
+    Если страница не помещается в одно сообщение, лишние пользователи уходят на соседнюю:
+    с конца при листании вперед, с начала при листании назад
+    """
+    header = "📊 *Содержимое базы данных:*\n"
+    blocks = []
+    for row in users:
+        blocks.append(
+            f"👤 Пользователь:\n"
+            f'🆔 ID: {row["user_id"]}\n'
+            f'👨‍💻 Имя (ФИО): {shorten(str(row["username"]))}\n'
+            f'📱 Telegram-ник: @{shorten(str(row["telegram_username"] or "не указан"))}\n'
+            # f'📋 Статус: {"✅ Одобрен" if row["approved"] else "⏳ Ожидает одобрения"}\n'
+            # f'🔑 Права доступа: {row["access_rights"]}\n'
+            # f'{"=" * 20}\n'
+        )
+    users = list(users)
+    length = size(header) + sum(size(block) + 1 for block in blocks)
+    while len(blocks) > 1 and length > MAX_MESSAGE_LENGTH:
+        index = 0 if backward else -1
+        length -= size(blocks.pop(index)) + 1
+        users.pop(index)
+        if backward:
+            has_prev = True
+        else:
+            has_next = True
+    lines = [header] + blocks
+    builder = InlineKeyboardBuilder()
+    if has_prev:
+        builder.button(text="⬅️ Назад",
+                       callback_data=ShowDbPage(backward=True, cursor=users[0]["user_id"]))
+    if has_next:
+        builder.button(text="Вперед ➡️",
+                       callback_data=ShowDbPage(backward=False, cursor=users[-1]["user_id"]))
+    return "\n".join(lines), builder.as_markup()
+
 @router.message(Command(commands=["show_db"]))
 async def cmd_show_db(message: Message):
     # user_id = message.from_user.id
-    # if user_id not in db_user.get_admins_id():
+    # if not await db_user.is_admin(user_id):
     #     await message.answer("У вас нет прав на выполнение этой команды.")
     # return
     
     try:
-        rows = db_user.get_all_users()
+        users, has_next = await db_user.get_users_page(limit=SHOW_DB_PAGE_SIZE)
 
-        if not rows:
+        if not users:
             await message.answer("База данных пуста.")
             return
 
-        text = "📊 *Содержимое базы данных:*\n\n"
-        for row in rows:
-            text += (
-                f"👤 Пользователь:\n"
-                f'🆔 ID: {row["user_id"]}\n'
-                f'👨‍💻 Имя (ФИО): {row["username"]}\n'
-                f'📱 Telegram-ник: @{row["telegram_username"] or "не указан"}\n'
-                # f'📋 Статус: {"✅ Одобрен" if row["approved"] else "⏳ Ожидает одобрения"}\n'
-                # f'🔑 Права доступа: {row["access_rights"]}\n'
-                # f'{"=" * 20}\n'
-            )
-        max_length = 4096
-        for i in range(0, len(text), max_length):
-            chunk = text[i:i + max_length]
-            await message.answer(chunk)
+        text, keyboard = render_users_page(users, has_prev=False, has_next=has_next)
+        await message.answer(text, reply_markup=keyboard)
 
     except Exception as e:
         logging.error(f"Ошибка при получении данных из БД {e}")
         await message.answer("Произошла ошибка при получении данных из БД.")
+
+@router.callback_query(ShowDbPage.filter())
+async def show_db_page(callback: CallbackQuery, callback_data: ShowDbPage):
+    try:
+        users, has_more = await db_user.get_users_page(cursor=callback_data.cursor,
+                                                       limit=SHOW_DB_PAGE_SIZE,
+                                                       backward=callback_data.backward)
+        if not users:
+            await callback.answer("Больше записей нет")
+            return
+
+        if callback_data.backward:
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = True, has_more
+        text, keyboard = render_users_page(users, has_prev=has_prev, has_next=has_next,
+                                           backward=callback_data.backward)
+        await callback.message.edit_text(text, reply_markup=keyboard)
+        await callback.answer()
+
+    except Exception as e:
+        logging.error(f"Ошибка при получении данных из БД {e}")
+        await callback.answer("Произошла ошибка при получении данных из БД.")
@@ -1,6 +1,7 @@
 import asyncio
 import logging
 import os
+from contextlib import AsyncExitStack, asynccontextmanager
 from aiogram import Bot, Dispatcher
 from aiogram.types import BotCommand, BotCommandScopeDefault
 import sys
@@ -12,6 +13,19 @@ sys.path.append(str(ROOT_DIR))
 from app.handlers.handlers import router
 from app.handlers.login_handlers import router as login_router
 from app.handlers.admin_handlers import router as admin_router
+from app.sql_database.User import db_user
+from app.sql_database.fsm_storage import fsm_storage
+from app.services.numerology_client import BACKEND_MAX_CONCURRENCY, BACKEND_MAX_CONNECTIONS, NumerologyClient
+from app.services.jobs import NUMEROLOGY_MAX_QUEUE, NUMEROLOGY_WORKERS, JobQueue
+from app.services.log_writer import user_log_writer
+from app.services.assets import assets
+from app.services.sender import SEND_GLOBAL_RATE, sender
+from app.webhook import BOT_MODE, run_webhook
+from app.sharding import BOT_WORKERS, run_front
+from app.middlewares.throttling import THROTTLING_GLOBAL_BURST, THROTTLING_GLOBAL_RATE, ThrottlingMiddleware
+from app.middlewares.metrics import MetricsMiddleware, TelegramMetricsMiddleware
+from app.services.metrics import METRICS_PORT, registry, start_metrics_server
+from app.services.result_cache import result_cache
 from dotenv import load_dotenv
 # from src.numerology import api as num_api
 
@@ -19,7 +33,7 @@ load_dotenv(override=True)
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
-LOG_DIR = "./data/bot_logs"
+LOG_DIR = os.getenv("LOG_DIR", "./data/bot_logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 
 logging.basicConfig(
@@ -46,6 +60,106 @@ async def set_commands(bot: Bot):
     # Устанавливаем команды для бота
     await bot.set_my_commands(commands, scope=BotCommandScopeDefault())
 
+def register_runtime_metrics(job_queue, throttling):
+    """
+    Очереди и кэши, которые снимаются при каждом опросе /metrics
+    """
+    registry.gauge("bot_send_queue_depth", "Outbound messages waiting to be sent",
+                   lambda: sender.depth)
+    registry.gauge("bot_numerology_queue_depth", "Numerology jobs waiting in queue",
+                   lambda: job_queue.depth)
+    registry.gauge("bot_numerology_jobs_active", "Numerology jobs in progress",
+                   lambda: job_queue.active)
+    registry.counter_func("bot_user_cache_lookups_total", "User id/role cache lookups",
+                          lambda: {"hit": db_user.cache.hits, "miss": db_user.cache.misses}, labelname="result")
+    registry.counter_func("bot_result_cache_lookups_total", "Numerology result cache lookups",
+                          lambda: {"hit": result_cache.hits, "miss": result_cache.misses}, labelname="result")
+    registry.counter_func("bot_throttled_events_total", "Events dropped by rate limiting",
+                          lambda: dict(throttling.throttled), labelname="event_class")
+
+async def on_startup():
+    """
+    Подключение к базам - в хуке старта диспетчера, а не при импорте модулей
+    """
+    await asyncio.gather(db_user.connect(), fsm_storage.connect())
+    fsm_storage.start()
+
+
+def create_dispatcher(numerology_client: NumerologyClient, job_queue: JobQueue,
+                      throttling: ThrottlingMiddleware = None) -> Dispatcher:
+    """
+    Диспетчер бота со всеми middleware и роутерами, без запуска polling/вебхука.
+    Роутеры - модульные объекты, поэтому диспетчер создается один раз на процесс
+    """
+    # клиент бэкенда и очередь задач передаются в хендлеры как аргументы
+    dp = Dispatcher(storage=fsm_storage,
+                    numerology_client=numerology_client,
+                    job_queue=job_queue)
+    dp.startup.register(on_startup)
+    throttling = throttling or ThrottlingMiddleware()
+    dp.message.outer_middleware(throttling)
+    dp.callback_query.outer_middleware(throttling)
+    dp.message.middleware(MetricsMiddleware())
+    dp.callback_query.middleware(MetricsMiddleware())
+    dp.include_router(router)
+    dp.include_router(login_router)
+    dp.include_router(admin_router)
+    return dp
+
+
+def per_shard(limit: int, shards: int) -> int:
+    """
+    Доля целочисленного лимита на один воркер: в сумме не больше limit, но хотя бы 1
+    """
+    return max(1, limit // shards)
+
+
+@asynccontextmanager
+async def bot_runtime(bot: Bot, throttling: ThrottlingMiddleware = None,
+                      metrics_port: int = METRICS_PORT, shards: int = 1):
+    """
+    Фоновые сервисы и диспетчер бота. Сервисы останавливаются в обратном порядке,
+    в том числе если запуск упал на середине.
+    shards - число процессов-воркеров: общие на весь бот лимиты (отправка, входящие,
+    нагрузка на бэкенд нумерологии) делятся между ними, настройки в .env остаются на весь бот
+    """
+    async with AsyncExitStack() as stack:
+        stack.callback(db_user.close)
+        # aiogram закрывает storage в shutdown диспетчера, но не при падении запуска;
+        # повторное закрытие ничего не делает
+        stack.push_async_callback(fsm_storage.close)
+        await user_log_writer.start()
+        stack.push_async_callback(user_log_writer.stop)
+        await assets.start()
+        stack.push_async_callback(assets.stop)
+        sender.global_rate = SEND_GLOBAL_RATE / shards
+        await sender.start(bot)
+        stack.push_async_callback(sender.stop)
+        numerology_client = NumerologyClient(max_connections=per_shard(BACKEND_MAX_CONNECTIONS, shards),
+                                             max_concurrency=per_shard(BACKEND_MAX_CONCURRENCY, shards))
+        await numerology_client.start()
+        stack.push_async_callback(numerology_client.close)
+        job_queue = JobQueue(workers=per_shard(NUMEROLOGY_WORKERS, shards),
+                             max_queue=per_shard(NUMEROLOGY_MAX_QUEUE, shards))
+        await job_queue.start()
+        stack.push_async_callback(job_queue.stop)
+
+        throttling = throttling or ThrottlingMiddleware(
+            global_rate=THROTTLING_GLOBAL_RATE / shards,
+            global_burst=per_shard(THROTTLING_GLOBAL_BURST, shards))
+        dp = create_dispatcher(numerology_client, job_queue, throttling)
+        register_runtime_metrics(job_queue, throttling)
+        if metrics_port:
+            try:
+                metrics_runner = await start_metrics_server(port=metrics_port)
+            except OSError as e:
+                # метрики - не причина не запускать бота (например, порт занят)
+                logging.warning(f"Сервер метрик на порту {metrics_port} не запущен: {e}")
+            else:
+                stack.push_async_callback(metrics_runner.cleanup)
+        yield dp
+
+
 async def main():
     logging.info("Bot is starting...")
     try:
@@ -55,23 +169,32 @@ async def main():
             
         logging.info(f"Using token: {BOT_TOKEN[:5]}...{BOT_TOKEN[-5:]}")
         bot = Bot(token=BOT_TOKEN)
+        bot.session.middleware(TelegramMetricsMiddleware())
         
         # Verify connection to Telegram
+        # get_me, меню команд и сброс вебхука не зависят друг от друга - шлем параллельно,
+        # чтобы старт не ждал три последовательных round-trip до Bot API
+        startup_calls = [bot.get_me(), set_commands(bot)]
+        if BOT_MODE != "webhook":
+            startup_calls.append(bot.delete_webhook(drop_pending_updates=True))
         try:
-            me = await bot.get_me()
+            me, *_ = await asyncio.gather(*startup_calls)
             logging.info(f"Successfully connected as @{me.username}")
         except Exception as e:
             logging.error(f"Failed to connect to Telegram: {e}")
             return
             
-        dp = Dispatcher()
-        dp.include_router(router)
-        dp.include_router(login_router)
-        dp.include_router(admin_router)
-        await set_commands(bot)
-        logging.info("Starting polling...")
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot, timeout=5)
+        if BOT_WORKERS > 1:
+            logging.info(f"Starting {BOT_WORKERS} sharded workers...")
+            await run_front(bot, BOT_WORKERS)
+            return
+        async with bot_runtime(bot) as dp:
+            if BOT_MODE == "webhook":
+                logging.info("Starting webhook server...")
+                await run_webhook(bot, dp)
+            else:
+                logging.info("Starting polling...")
+                await dp.start_polling(bot, timeout=5)
     except Exception as e:
         logging.error(f"Error in main bot function: {e}", exc_info=True)
     finally:
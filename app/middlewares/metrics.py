@@ -0,0 +1,53 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+from app.services.metrics import HANDLER_ERRORS, HANDLER_SECONDS, TELEGRAM_ERRORS, TELEGRAM_SECONDS
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Inner-middleware: время и ошибки каждого хендлера с метками router (модуль) и handler (функция)
+    """
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        labels = {
+            "router": getattr(callback, "__module__", "unknown").rsplit(".", 1)[-1],
+            "handler": getattr(callback, "__name__", "unknown"),
+        }
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.inc(error=type(e).__name__, **labels)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, **labels)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: время и ошибки вызовов Bot API по методам
+    """
+    async def __call__(self,
+                       make_request: NextRequestMiddlewareType[TelegramType],
+                       bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        name = type(method).__name__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - start, method=name)
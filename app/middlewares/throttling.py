@@ -0,0 +1,149 @@
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+
+def _limit(event_class: str, rate: float, burst: int) -> tuple:
+    """
+    Лимит класса событий из .env: THROTTLING_<КЛАСС>_RATE и THROTTLING_<КЛАСС>_BURST
+    """
+    prefix = f"THROTTLING_{event_class.upper()}"
+    return (float(os.getenv(f"{prefix}_RATE", str(rate))),
+            int(os.getenv(f"{prefix}_BURST", str(burst))))
+
+
+# класс события -> (токенов в секунду, размер корзины)
+THROTTLING_LIMITS = {
+    "default": _limit("default", 1.0, 5),
+    "numerology": _limit("numerology", 0.1, 2),
+    "show_db": _limit("show_db", 0.2, 2),
+    "callback": _limit("callback", 2.0, 5),
+}
+THROTTLING_GLOBAL_RATE = float(os.getenv("THROTTLING_GLOBAL_RATE", "100"))
+THROTTLING_GLOBAL_BURST = int(os.getenv("THROTTLING_GLOBAL_BURST", "200"))
+THROTTLING_MAX_BUCKETS = int(os.getenv("THROTTLING_MAX_BUCKETS", "100000"))
+# не чаще одного предупреждения пользователю за столько секунд
+THROTTLING_WARN_INTERVAL = float(os.getenv("THROTTLING_WARN_INTERVAL", "10"))
+
+NUMEROLOGY_TEXTS = ("Сеанс нумерологии",)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, now: float) -> bool:
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение частоты входящих событий: token bucket на пользователя и класс команды,
+    плюс общий лимит на бота. Лишние события отбрасываются с коротким предупреждением
+    """
+    def __init__(self,
+                 limits: dict = None,
+                 global_rate: float = THROTTLING_GLOBAL_RATE,
+                 global_burst: int = THROTTLING_GLOBAL_BURST,
+                 max_buckets: int = THROTTLING_MAX_BUCKETS,
+                 warn_interval: float = THROTTLING_WARN_INTERVAL):
+        self.limits = dict(THROTTLING_LIMITS if limits is None else limits)
+        self.global_bucket = TokenBucket(global_rate, global_burst, time.monotonic())
+        self.max_buckets = max_buckets
+        self.warn_interval = warn_interval
+        self.allowed = Counter()
+        self.throttled = Counter()
+        self._buckets = OrderedDict()
+        self._warned = OrderedDict()
+
+    @staticmethod
+    def classify(event: TelegramObject) -> str:
+        if isinstance(event, CallbackQuery):
+            return "callback"
+        if isinstance(event, Message):
+            if event.document is not None or event.text in NUMEROLOGY_TEXTS:
+                return "numerology"
+            if event.text and event.text.startswith("/"):
+                command = event.text.split()[0][1:].split("@")[0]
+                if command in THROTTLING_LIMITS:
+                    return command
+        return "default"
+
+    def _bucket(self, user_id: int, event_class: str, now: float) -> TokenBucket:
+        key = (user_id, event_class)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            rate, burst = self.limits.get(event_class, self.limits["default"])
+            bucket = TokenBucket(rate, burst, now)
+            self._buckets[key] = bucket
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _should_warn(self, user_id: int, now: float) -> bool:
+        last = self._warned.get(user_id)
+        if last is not None and now - last < self.warn_interval:
+            return False
+        self._warned[user_id] = now
+        self._warned.move_to_end(user_id)
+        while len(self._warned) > self.max_buckets:
+            self._warned.popitem(last=False)
+        return True
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        event_class = self.classify(event)
+        bucket = self._bucket(user.id, event_class, now)
+        bucket.refill(now)
+        self.global_bucket.refill(now)
+        # токен списывается только если пропускают обе корзины: при общей перегрузке
+        # лимит пользователя не расходуется на отброшенные события
+        if bucket.tokens >= 1 and self.global_bucket.tokens >= 1:
+            bucket.tokens -= 1
+            self.global_bucket.tokens -= 1
+            self.allowed[event_class] += 1
+            return await handler(event, data)
+
+        self.throttled[event_class] += 1
+        if self._should_warn(user.id, now):
+            if isinstance(event, CallbackQuery):
+                await event.answer("Слишком часто, подождите немного")
+            elif isinstance(event, Message):
+                await event.answer("Слишком много запросов, подождите немного 🙏")
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "allowed": dict(self.allowed),
+            "throttled": dict(self.throttled),
+            "buckets": len(self._buckets),
+        }
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+from string import Formatter
+
+from aiogram.types import BufferedInputFile
+
+TEMPLATES_DIR = "app/bot_messages"
+DOCUMENTS = {
+    "questionnaire": ("app/temp/questionnaire.xlsx", "Опрос_нумерология.xlsx"),
+}
+ASSETS_RELOAD_INTERVAL = float(os.getenv("ASSETS_RELOAD_INTERVAL", "5"))
+
+
+class Template:
+    """
+    Текст сообщения с заранее разобранными плейсхолдерами {name}
+    """
+    def __init__(self, text: str):
+        self.text = text
+        self.fields = frozenset(
+            name for _, name, _, _ in Formatter().parse(text) if name
+        )
+
+    def render(self, **kwargs) -> str:
+        if not self.fields:
+            return self.text
+        return self.text.format(**kwargs)
+
+
+class AssetRegistry:
+    """
+    Шаблоны app/bot_messages и статические документы, загруженные в память при старте.
+    Измененные файлы перечитываются в фоне по mtime, хендлеры не трогают диск.
+    Для документов запоминается file_id после первой отправки, чтобы не загружать их повторно
+    """
+    def __init__(self, templates_dir: str = TEMPLATES_DIR, documents: dict = None):
+        self.templates_dir = templates_dir
+        self.documents = dict(DOCUMENTS if documents is None else documents)
+        self._templates = {}
+        self._files = {}
+        self._file_ids = {}
+        self._mtimes = {}
+        self._loaded = False
+        self._task = None
+
+    def _sources(self) -> dict:
+        """
+        имя ассета -> путь к файлу
+        """
+        sources = {}
+        for filename in os.listdir(self.templates_dir):
+            name, ext = os.path.splitext(filename)
+            if ext == ".txt":
+                sources[name] = os.path.join(self.templates_dir, filename)
+        for name, (path, _) in self.documents.items():
+            sources[name] = path
+        return sources
+
+    def _load_one(self, name: str, path: str):
+        if name in self.documents:
+            with open(path, "rb") as f:
+                self._files[name] = f.read()
+            self._file_ids.pop(name, None)
+        else:
+            with open(path, encoding="utf-8") as f:
+                self._templates[name] = Template(f.read())
+        self._mtimes[name] = os.stat(path).st_mtime_ns
+
+    def load(self):
+        for name, path in self._sources().items():
+            self._load_one(name, path)
+        self._loaded = True
+
+    def reload_changed(self) -> list:
+        """
+        Перечитывает файлы, у которых изменился mtime. Возвращает имена перечитанных
+        """
+        reloaded = []
+        for name, path in self._sources().items():
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if self._mtimes.get(name) != mtime:
+                self._load_one(name, path)
+                reloaded.append(name)
+        return reloaded
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def template(self, name: str) -> Template:
+        self._ensure_loaded()
+        return self._templates[name]
+
+    def render(self, name: str, **kwargs) -> str:
+        return self.template(name).render(**kwargs)
+
+    def document(self, name: str):
+        """
+        InputFile для отправки: file_id, если документ уже отправлялся, иначе байты из памяти
+        """
+        self._ensure_loaded()
+        file_id = self._file_ids.get(name)
+        if file_id:
+            return file_id
+        _, filename = self.documents[name]
+        return BufferedInputFile(self._files[name], filename=filename)
+
+    def remember_file_id(self, name: str, file_id: str):
+        self._file_ids[name] = file_id
+
+    async def _watch(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                reloaded = await asyncio.to_thread(self.reload_changed)
+                if reloaded:
+                    logging.info(f"Перечитаны ассеты: {', '.join(reloaded)}")
+            except Exception as e:
+                logging.error(f"Ошибка при перечитывании ассетов: {e}")
+
+    async def start(self, interval: float = ASSETS_RELOAD_INTERVAL):
+        await asyncio.to_thread(self.load)
+        if self._task is None and interval > 0:
+            self._task = asyncio.create_task(self._watch(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+assets = AssetRegistry()
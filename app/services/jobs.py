@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+NUMEROLOGY_WORKERS = int(os.getenv("NUMEROLOGY_WORKERS", "4"))
+NUMEROLOGY_MAX_QUEUE = int(os.getenv("NUMEROLOGY_MAX_QUEUE", "1000"))
+NUMEROLOGY_JOB_TIMEOUT = float(os.getenv("NUMEROLOGY_JOB_TIMEOUT", "900"))
+# о продвижении очереди сообщается, когда позиция уменьшилась хотя бы вдвое с прошлого сообщения
+# и прошло не меньше интервала (секунд), и когда задача следующая - на задачу O(log позиции) сообщений
+NUMEROLOGY_POSITION_INTERVAL = float(os.getenv("NUMEROLOGY_POSITION_INTERVAL", "30"))
+
+
+class QueueFull(Exception):
+    """
+    В очереди нет места
+    """
+
+
+@dataclass
+class Job:
+    user_id: int
+    func: Callable[..., Awaitable[Any]]
+    args: tuple = field(default_factory=tuple)
+    # вызывается с исключением, если задача упала или не уложилась в таймаут
+    on_error: Optional[Callable[[Exception], Awaitable[Any]]] = None
+    # вызывается с новой позицией в очереди
+    on_position: Optional[Callable[[int], Awaitable[Any]]] = None
+    # последняя сообщенная позиция и когда (time.monotonic)
+    notified_position: int = 0
+    notified_at: float = 0.0
+
+
+class JobQueue:
+    """
+    Очередь фоновых задач с пулом воркеров: хендлер ставит задачу и сразу возвращается.
+    Одновременно выполняется не больше workers задач, у пользователя - не больше одной
+    задачи в очереди или в работе
+    """
+    def __init__(self,
+                 workers: int = NUMEROLOGY_WORKERS,
+                 max_queue: int = NUMEROLOGY_MAX_QUEUE,
+                 timeout: float = NUMEROLOGY_JOB_TIMEOUT,
+                 position_interval: float = NUMEROLOGY_POSITION_INTERVAL,
+                 name: str = "numerology"):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.position_interval = position_interval
+        self.name = name
+        self._queue = None
+        self._pending = OrderedDict()
+        self._running = set()
+        self._tasks = []
+        self._callbacks = set()
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    @property
+    def active(self) -> int:
+        return len(self._running)
+
+    def has_job(self, user_id: int) -> bool:
+        return user_id in self._pending or user_id in self._running
+
+    def position(self, user_id: int) -> int:
+        """
+        Позиция задачи пользователя в очереди (1 - следующая), 0 - если уже выполняется или нет
+        """
+        for number, pending_user_id in enumerate(self._pending, start=1):
+            if pending_user_id == user_id:
+                return number
+        return 0
+
+    def submit(self, user_id: int, func: Callable[..., Awaitable[Any]], *args,
+               on_error: Callable[[Exception], Awaitable[Any]] = None,
+               on_position: Callable[[int], Awaitable[Any]] = None) -> int:
+        """
+        Ставит задачу в очередь, возвращает позицию в очереди.
+        Если у пользователя уже есть задача - возвращает 0 и ничего не ставит.
+        on_error получает исключение упавшей задачи, on_position - новую позицию по мере продвижения
+        """
+        if self.has_job(user_id):
+            return 0
+        if self._queue is None:
+            raise RuntimeError("JobQueue is not started")
+        if len(self._pending) >= self.max_queue:
+            raise QueueFull(f"В очереди {self.name} уже {self.max_queue} задач")
+        job = Job(user_id=user_id, func=func, args=args, on_error=on_error, on_position=on_position)
+        self._pending[user_id] = job
+        self._queue.put_nowait(job)
+        # позицию при постановке сообщает сам вызывающий
+        job.notified_position = len(self._pending)
+        job.notified_at = time.monotonic()
+        return job.notified_position
+
+    def _callback(self, callback: Callable[..., Awaitable[Any]], *args):
+        """
+        Запускает колбэк задачи отдельным таском, чтобы воркер не ждал отправку сообщений
+        """
+        async def run():
+            try:
+                await callback(*args)
+            except Exception as e:
+                logging.error(f"Ошибка колбэка очереди {self.name}: {e!r}")
+
+        task = asyncio.create_task(run())
+        self._callbacks.add(task)
+        task.add_done_callback(self._callbacks.discard)
+
+    def _notify_positions(self):
+        now = time.monotonic()
+        for position, job in enumerate(self._pending.values(), start=1):
+            if job.on_position is None or position >= job.notified_position:
+                continue
+            next_in_line = position == 1
+            halved = position <= job.notified_position // 2 and now - job.notified_at >= self.position_interval
+            if next_in_line or halved:
+                job.notified_position = position
+                job.notified_at = now
+                self._callback(job.on_position, position)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self._pending.pop(job.user_id, None)
+            self._running.add(job.user_id)
+            self._notify_positions()
+            try:
+                await asyncio.wait_for(job.func(*job.args), self.timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Ошибка задачи {self.name} пользователя {job.user_id}: {e!r}", exc_info=True)
+                if job.on_error is not None:
+                    self._callback(job.on_error, e)
+            finally:
+                self._running.discard(job.user_id)
+                self._queue.task_done()
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain_timeout: float = 30):
+        """
+        Дает воркерам дообработать очередь (не дольше drain_timeout) и останавливает их
+        """
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Очередь {self.name} не успела обработаться: осталось {self.depth} задач")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # сообщения об ошибках и позициях успевают уйти в отправку до остановки sender
+        if self._callbacks:
+            await asyncio.wait(list(self._callbacks), timeout=drain_timeout)
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+
+LOG_DIR = os.getenv("LOG_DIR", "./data/bot_logs")
+
+LOG_MAX_OPEN_FILES = int(os.getenv("LOG_MAX_OPEN_FILES", "64"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1.0"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+LOG_MAX_QUEUE = int(os.getenv("LOG_MAX_QUEUE", "100000"))
+
+_STOP = object()
+
+
+class UserLogWriter:
+    """
+    Фоновая запись пользовательских логов data/bot_logs/user_<id>.log.
+    Хендлер только кладет строку в очередь, запись идет пачками в отдельном потоке
+    по порогу времени или размера, открытые файлы переиспользуются (LRU-пул).
+    """
+    def __init__(self,
+                 log_dir: str = LOG_DIR,
+                 max_open_files: int = LOG_MAX_OPEN_FILES,
+                 flush_interval: float = LOG_FLUSH_INTERVAL,
+                 batch_size: int = LOG_BATCH_SIZE,
+                 max_queue: int = LOG_MAX_QUEUE):
+        self.log_dir = log_dir
+        self.max_open_files = max_open_files
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._files = OrderedDict()
+        self._queue = None
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def path(self, user_id) -> str:
+        return os.path.join(self.log_dir, f"user_{user_id}.log")
+
+    def write(self, user_id, line: str):
+        """
+        Ставит строку в очередь на запись. Без запущенного писателя пишет сразу
+        """
+        if not self.running:
+            self._write_batch([(user_id, line)])
+            return
+        try:
+            self._queue.put_nowait((user_id, line))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def start(self):
+        if self.running:
+            return
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Дописывает все, что осталось в очереди, и закрывает файлы
+        """
+        if self.running:
+            await self._queue.put(_STOP)
+            await self._task
+        self._task = None
+        self._close_files()
+        if self.dropped:
+            logging.warning(f"Пропущено записей пользовательских логов: {self.dropped}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = []
+            item = await self._queue.get()
+            deadline = loop.time() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                timeout = deadline - loop.time()
+                if len(batch) >= self.batch_size or timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if stopping:
+                while not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    if item is not _STOP:
+                        batch.append(item)
+            if batch:
+                try:
+                    await asyncio.to_thread(self._write_batch, batch)
+                except Exception as e:
+                    logging.error(f"Ошибка записи пользовательских логов: {e}")
+
+    def _get_file(self, user_id):
+        f = self._files.get(user_id)
+        if f is not None:
+            self._files.move_to_end(user_id)
+            return f
+        if len(self._files) >= self.max_open_files:
+            _, oldest = self._files.popitem(last=False)
+            oldest.close()
+        f = open(self.path(user_id), "a", encoding="utf-8")
+        self._files[user_id] = f
+        return f
+
+    def _write_batch(self, batch: list):
+        lines = {}
+        for user_id, line in batch:
+            lines.setdefault(user_id, []).append(line)
+        for user_id, user_lines in lines.items():
+            f = self._get_file(user_id)
+            f.write("".join(user_lines))
+            f.flush()
+
+    def _close_files(self):
+        while self._files:
+            _, f = self._files.popitem()
+            f.close()
+
+
+user_log_writer = UserLogWriter()
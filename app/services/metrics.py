@@ -0,0 +1,190 @@
+import bisect
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# 0 - не поднимать сервер метрик (по умолчанию), например 9101 - включить
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (),
+                 buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        record = self._values.get(key)
+        if record is None:
+            record = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        record[0][bisect.bisect_left(self.buckets, value)] += 1
+        record[1] += value
+        record[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Gauge:
+    """
+    Значение снимается при каждом опросе: func() -> число или {значение метки: число}
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, func, labelname: str = None):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+        self.labelname = labelname
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        value = self.func()
+        if isinstance(value, dict):
+            for label, item in sorted(value.items()):
+                lines.append(f'{self.name}{{{self.labelname}="{_escape(label)}"}} {_format_value(item)}')
+        else:
+            lines.append(f"{self.name} {_format_value(value)}")
+        return lines
+
+
+class CounterFunc(Gauge):
+    """
+    Счетчик, который ведет сам сервис (hits/misses кэша и т.п.): значение снимается при опросе,
+    как у Gauge, но отдается типом counter - только растет, к нему применяют rate()
+    """
+    kind = "counter"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def counter_func(self, *args, **kwargs) -> CounterFunc:
+        return self.register(CounterFunc(*args, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logging.error(f"Ошибка при сборе метрики {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HANDLER_SECONDS = registry.histogram(
+    "bot_handler_duration_seconds", "Handler latency", ("router", "handler"))
+HANDLER_ERRORS = registry.counter(
+    "bot_handler_errors_total", "Handler exceptions", ("router", "handler", "error"))
+DB_QUERY_SECONDS = registry.histogram(
+    "bot_db_query_duration_seconds", "UserDatabase query latency", ("method",))
+BACKEND_SECONDS = registry.histogram(
+    "bot_backend_request_duration_seconds", "Numerology backend request latency", ("endpoint", "status"))
+TELEGRAM_SECONDS = registry.histogram(
+    "bot_telegram_api_duration_seconds", "Telegram Bot API call latency", ("method",))
+TELEGRAM_ERRORS = registry.counter(
+    "bot_telegram_api_errors_total", "Telegram Bot API call errors", ("method", "error"))
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(body=registry.render().encode("utf-8"),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> web.AppRunner:
+    """
+    HTTP-сервер с /metrics в текстовом формате Prometheus
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host=host, port=port).start()
+    except OSError:
+        await runner.cleanup()
+        raise
+    logging.info(f"Metrics server listening on {host}:{port}/metrics")
+    return runner
@@ -0,0 +1,145 @@
+import asyncio
+import base64
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+
+import aiohttp
+from dotenv import load_dotenv
+
+from app.services.metrics import BACKEND_SECONDS
+
+load_dotenv(override=True)
+
+BACKEND_HOST = os.getenv("BACKEND_HOST", "localhost")
+BACKEND_PORT = os.getenv("BACKEND_PORT")
+BACKEND_URL = os.getenv("BACKEND_URL", f"http://{BACKEND_HOST}:{BACKEND_PORT}")
+
+BACKEND_MAX_CONNECTIONS = int(os.getenv("BACKEND_MAX_CONNECTIONS", "20"))
+BACKEND_MAX_CONCURRENCY = int(os.getenv("BACKEND_MAX_CONCURRENCY", "8"))
+BACKEND_TIMEOUT = float(os.getenv("BACKEND_TIMEOUT", "300"))
+BACKEND_CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", "10"))
+BACKEND_RETRIES = int(os.getenv("BACKEND_RETRIES", "3"))
+BACKEND_BACKOFF = float(os.getenv("BACKEND_BACKOFF", "0.5"))
+BACKEND_MAX_BACKOFF = float(os.getenv("BACKEND_MAX_BACKOFF", "10"))
+# binary - просим pdf сырыми байтами, json - pdf в base64 внутри json
+BACKEND_PDF_MODE = os.getenv("BACKEND_PDF_MODE", "binary")
+BINARY_CONTENT_TYPES = ("application/pdf", "application/octet-stream")
+# повторяются только ошибки до отправки запроса (не удалось соединиться): таймаут чтения значит,
+# что бэкенд уже считает анкету, и повтор заставил бы его делать ту же долгую работу заново
+RETRYABLE_ERRORS = (aiohttp.ClientConnectorError,
+                    getattr(aiohttp, "ConnectionTimeoutError", aiohttp.ClientConnectorError))
+
+
+class BackendError(Exception):
+    """
+    Бэкенд нумерологии ответил ошибкой
+    """
+    def __init__(self, status: int, text: str):
+        super().__init__(f"{status}: {text[:200]}")
+        self.status = status
+        self.text = text
+
+
+@dataclass
+class NumerologyResult:
+    pdf: bytes
+    link: str = None
+
+
+class NumerologyClient:
+    """
+    HTTP-клиент бэкенда нумерологии на все время работы приложения:
+    пул keep-alive соединений, ограничение числа одновременных запросов,
+    таймауты и повторы с jitter-backoff на 5xx и ошибках соединения (не на таймаутах ответа).
+    """
+    def __init__(self,
+                 base_url: str = BACKEND_URL,
+                 max_connections: int = BACKEND_MAX_CONNECTIONS,
+                 max_concurrency: int = BACKEND_MAX_CONCURRENCY,
+                 timeout: float = BACKEND_TIMEOUT,
+                 connect_timeout: float = BACKEND_CONNECT_TIMEOUT,
+                 retries: int = BACKEND_RETRIES,
+                 backoff: float = BACKEND_BACKOFF,
+                 max_backoff: float = BACKEND_MAX_BACKOFF,
+                 pdf_mode: str = BACKEND_PDF_MODE):
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pdf_mode = pdf_mode
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _delay(self, attempt: int) -> float:
+        # full jitter: случайная пауза от 0 до экспоненциальной границы
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    @staticmethod
+    async def _read_json(response: aiohttp.ClientResponse):
+        return await response.json()
+
+    async def _request(self, method: str, path: str, read=None, **kwargs):
+        """
+        Запрос с повторами. read(response) разбирает успешный ответ, по умолчанию - json
+        """
+        read = read or self._read_json
+        await self.start()
+        url = f"{self.base_url}{path}"
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                last_attempt = attempt == self.retries
+                start = time.perf_counter()
+                status = "error"
+                try:
+                    async with self._session.request(method, url, **kwargs) as response:
+                        status = str(response.status)
+                        if response.status >= 500 and not last_attempt:
+                            logging.warning(f"Бэкенд нумерологии вернул {response.status}, повтор {attempt + 1}")
+                        elif response.status != 200:
+                            raise BackendError(response.status, await response.text())
+                        else:
+                            return await read(response)
+                except RETRYABLE_ERRORS as e:
+                    if last_attempt:
+                        raise
+                    logging.warning(f"Ошибка соединения с бэкендом нумерологии: {e!r}, повтор {attempt + 1}")
+                finally:
+                    BACKEND_SECONDS.observe(time.perf_counter() - start, endpoint=path, status=status)
+                await asyncio.sleep(self._delay(attempt))
+
+    @staticmethod
+    async def _read_result(response: aiohttp.ClientResponse) -> NumerologyResult:
+        if response.content_type in BINARY_CONTENT_TYPES:
+            # pdf читается из сокета один раз, без base64 и промежуточного json
+            return NumerologyResult(pdf=await response.read(),
+                                    link=response.headers.get("X-Result-Link"))
+        num_answer = await response.json()
+        return NumerologyResult(pdf=base64.b64decode(num_answer["pdf"]),
+                                link=num_answer.get("link"))
+
+    async def analyze_user(self, user_info: dict) -> NumerologyResult:
+        """
+        Нумерологический анализ по анкете: pdf и ссылка на таблицу.
+        В режиме binary бэкенд может вернуть pdf сырыми байтами (ссылка - в заголовке X-Result-Link),
+        если он так не умеет - разбирается прежний json с pdf в base64
+        """
+        headers = {}
+        if self.pdf_mode == "binary":
+            headers["Accept"] = "application/pdf, application/json;q=0.5"
+        return await self._request("POST", "/numerology/user/", read=self._read_result,
+                                   json=user_info, headers=headers)
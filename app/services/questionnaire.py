@@ -0,0 +1,226 @@
+import asyncio
+import io
+import json
+import os
+from datetime import datetime
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from aiogram import Bot
+from aiogram.types import Document
+from dotenv import load_dotenv
+
+# pandas импортируется при первой анкете, а не при старте бота
+if TYPE_CHECKING:
+    import pandas as pd
+
+load_dotenv(override=True)
+
+# максимальный размер анкеты, больше - не скачиваем
+MAX_QUESTIONNAIRE_SIZE = int(os.getenv("MAX_QUESTIONNAIRE_SIZE", str(2 * 1024 * 1024)))
+USER_INFO_DIR = os.getenv("USER_INFO_DIR", "./data/numerology/users")
+# сколько последних анкет хранить на пользователя, старые удаляются; 0 - хранить все
+USER_INFO_KEEP = int(os.getenv("USER_INFO_KEEP", "5"))
+FIELD_MAPPING_PATH = os.getenv("FIELD_MAPPING_PATH", "./data/numerology/field_mapping.json")
+# поля анкеты с датами, переводятся в ISO формат
+DATE_FIELDS = ("Дата рождения", "Дата консультирования")
+
+
+class QuestionnaireTooLarge(Exception):
+    """
+    Анкета превышает MAX_QUESTIONNAIRE_SIZE
+    """
+
+
+class LimitedBuffer(io.BytesIO):
+    """
+    BytesIO, который прерывает скачивание при превышении лимита
+    """
+    def __init__(self, limit: int):
+        super().__init__()
+        self.limit = limit
+
+    def write(self, data) -> int:
+        if self.tell() + len(data) > self.limit:
+            raise QuestionnaireTooLarge(f"Файл больше {self.limit} байт")
+        return super().write(data)
+
+
+async def download_questionnaire(bot: Bot, document: Document,
+                                 limit: int = MAX_QUESTIONNAIRE_SIZE) -> io.BytesIO:
+    """
+    Скачивает анкету в память. Размер проверяется до скачивания (по file_size)
+    и во время него - если Telegram не сообщил размер или он неверен
+    """
+    if document.file_size and document.file_size > limit:
+        raise QuestionnaireTooLarge(f"Файл больше {limit} байт")
+    buffer = LimitedBuffer(limit)
+    file = await bot.get_file(document.file_id)
+    await bot.download_file(file.file_path, destination=buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def read_questionnaire(buffer: io.BytesIO) -> "pd.DataFrame":
+    """
+    Читает первые два столбца анкеты потоковым read-only ридером openpyxl.
+    Первая строка - заголовок, как в pd.read_excel
+    """
+    import pandas as pd
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(buffer, read_only=True, data_only=True)
+    try:
+        rows = []
+        for row in workbook.active.iter_rows(max_col=2, values_only=True):
+            row = tuple(row) + (None,) * (2 - len(row))
+            if row[0] is None and row[1] is None:
+                continue
+            rows.append(row)
+    finally:
+        workbook.close()
+    if not rows:
+        return pd.DataFrame(columns=["field", "value"])
+    return pd.DataFrame(rows[1:], columns=list(rows[0]))
+
+
+def _prune_user_info(user_dir: str, keep: int):
+    """
+    Оставляет keep последних анкет пользователя: имя файла - id сообщения, они растут
+    """
+    requests = []
+    for name in os.listdir(user_dir):
+        stem, extension = os.path.splitext(name)
+        if extension == ".json" and stem.isdigit():
+            requests.append(int(stem))
+    for request_id in sorted(requests)[:-keep]:
+        try:
+            os.remove(os.path.join(user_dir, f"{request_id}.json"))
+        except FileNotFoundError:
+            pass
+
+
+async def save_user_info(user_info: dict, user_id: int, request_id: int,
+                         keep: int = USER_INFO_KEEP) -> str:
+    """
+    Сохраняет анкету отдельным файлом на каждого пользователя и запрос, не блокируя event loop.
+    У пользователя остаются только keep последних анкет
+    """
+    user_dir = os.path.join(USER_INFO_DIR, str(user_id))
+    path = os.path.join(user_dir, f"{request_id}.json")
+
+    def _write():
+        os.makedirs(user_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(user_info, f, ensure_ascii=False, indent=4)
+        if keep > 0:
+            _prune_user_info(user_dir, keep)
+
+    await asyncio.to_thread(_write)
+    return path
+
+
+class FieldMapping:
+    """
+    Скомпилированный field_mapping.json: поле анкеты -> (раздел, ключ)
+    в виде готовых для pandas словарей
+    """
+    def __init__(self, mapping: dict):
+        self.fields = list(mapping)
+        self.sections = {field: section for field, (section, key) in mapping.items()}
+        # key "None" - поле "desire", которое не вложенный объект
+        self.keys = {field: (None if key == "None" else key) for field, (section, key) in mapping.items()}
+
+
+@lru_cache(maxsize=None)
+def load_field_mapping(path: str = FIELD_MAPPING_PATH) -> FieldMapping:
+    """
+    Читает и компилирует маппинг один раз на процесс
+    """
+    with open(path, encoding="utf-8") as f:
+        return FieldMapping(json.load(f))
+
+
+def _empty_user_info() -> dict:
+    return {
+        "base": {},
+        "base_optional": {},
+        "desire": "",
+        "desire_optional": {},
+        "optional": {}
+    }
+
+
+def _convert_dates(values: "pd.Series") -> "pd.Series":
+    """
+    DD.MM.YYYY -> YYYY-MM-DD и datetime -> YYYY-MM-DD для всего столбца сразу.
+    Значения, которые не удалось преобразовать, остаются как есть
+    """
+    import pandas as pd
+
+    values = values.copy()
+    is_text = values.map(lambda v: isinstance(v, str))
+    parts = values[is_text].str.split(".")
+    parts = parts[parts.str.len() == 3]
+    values.loc[parts.index] = parts.str[2] + "-" + parts.str[1] + "-" + parts.str[0]
+
+    is_datetime = values.map(lambda v: isinstance(v, datetime))
+    if is_datetime.any():
+        values.loc[is_datetime] = pd.to_datetime(values[is_datetime]).dt.strftime("%Y-%m-%d")
+    return values
+
+
+def fill_mapping_many(questionnaires: list, mapping: FieldMapping = None) -> list:
+    """
+    Переводит пачку анкет (DataFrame: поле, значение) в json для бэкенда.
+    Все анкеты склеиваются в один DataFrame и обрабатываются столбцами
+    """
+    import numpy as np
+    import pandas as pd
+
+    if mapping is None:
+        mapping = load_field_mapping()
+    results = [_empty_user_info() for _ in questionnaires]
+
+    fields, values, numbers = [], [], []
+    for number, frame in enumerate(questionnaires):
+        if frame.shape[1] < 2:  # Пропускаем анкеты без значений
+            continue
+        array = frame.to_numpy(dtype=object)
+        fields.append(array[:, 0])
+        values.append(array[:, 1])
+        numbers.append(np.full(len(array), number))
+    if not fields:
+        return results
+
+    data = pd.DataFrame({
+        "field": np.concatenate(fields),
+        "value": np.concatenate(values),
+        "number": np.concatenate(numbers),
+    })
+    data["value"] = data["value"].astype(object)
+    data = data[data["field"].isin(mapping.fields)]
+    if data.empty:
+        return results
+
+    is_date = data["field"].isin(DATE_FIELDS)
+    if is_date.any():
+        data.loc[is_date, "value"] = _convert_dates(data.loc[is_date, "value"])
+
+    sections = data["field"].map(mapping.sections).to_numpy()
+    keys = data["field"].map(mapping.keys).to_numpy()
+    values = data["value"].to_numpy()
+    numbers = data["number"].to_numpy()
+    # NaN из pandas map для ключа "None" тоже означает "не вложенный объект"
+    keys = np.where(pd.isna(keys), None, keys)
+
+    for number, section, key, value in zip(numbers, sections, keys, values):
+        if key is None:
+            results[number][section] = value
+        else:
+            results[number][section][key] = value
+    return results
+
+
+def fill_mapping(user_info: "pd.DataFrame") -> dict:
+    return fill_mapping_many([user_info])[0]
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "./data/numerology/cache")
+RESULT_CACHE_MEMORY_SIZE = int(os.getenv("RESULT_CACHE_MEMORY_SIZE", str(64 * 1024 * 1024)))
+RESULT_CACHE_DISK_SIZE = int(os.getenv("RESULT_CACHE_DISK_SIZE", str(1024 * 1024 * 1024)))
+# сколько секунд результат считается актуальным, 0 - бессрочно
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 60 * 60)))
+
+
+def normalize(value):
+    """
+    Приводит анкету к каноническому виду: обрезает пробелы, NaN -> None
+    """
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class ResultCache:
+    """
+    Кэш результатов нумерологии по хэшу нормализованной анкеты (user_info).
+    Два уровня: LRU в памяти и ограниченный по размеру каталог на диске, у обоих есть срок жизни
+    """
+    def __init__(self,
+                 cache_dir: str = RESULT_CACHE_DIR,
+                 memory_size: int = RESULT_CACHE_MEMORY_SIZE,
+                 disk_size: int = RESULT_CACHE_DISK_SIZE,
+                 ttl: float = RESULT_CACHE_TTL):
+        self.cache_dir = cache_dir
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+
+    @staticmethod
+    def key(user_info: dict) -> str:
+        payload = json.dumps(normalize(user_info), sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl > 0 and created_at < time.time() - self.ttl
+
+    def _paths(self, key: str) -> tuple:
+        return (os.path.join(self.cache_dir, f"{key}.pdf"),
+                os.path.join(self.cache_dir, f"{key}.json"))
+
+    # ============ память ============
+
+    def _memory_get(self, key: str):
+        record = self._memory.get(key)
+        if record is None:
+            return None
+        if self._expired(record[0]):
+            self._memory_pop(key)
+            return None
+        self._memory.move_to_end(key)
+        return record
+
+    def _memory_put(self, key: str, record: tuple):
+        if len(record[1]) > self.memory_size:
+            return
+        self._memory_pop(key)
+        self._memory[key] = record
+        self._memory_bytes += len(record[1])
+        while self._memory_bytes > self.memory_size:
+            oldest = next(iter(self._memory))
+            self._memory_pop(oldest)
+
+    def _memory_pop(self, key: str):
+        record = self._memory.pop(key, None)
+        if record is not None:
+            self._memory_bytes -= len(record[1])
+
+    # ============ диск (выполняется в пуле потоков) ============
+
+    def _disk_get(self, key: str):
+        pdf_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if self._expired(meta["created_at"]):
+                self._disk_remove(key)
+                return None
+            with open(pdf_path, "rb") as f:
+                pdf = f.read()
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        # mtime - время последнего обращения, по нему вытесняем
+        os.utime(pdf_path)
+        return meta["created_at"], pdf, meta.get("link")
+
+    def _disk_put(self, key: str, record: tuple):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        pdf_path, meta_path = self._paths(key)
+        created_at, pdf, link = record
+        tmp_path = pdf_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp_path, pdf_path)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"created_at": created_at, "link": link}, f)
+        self._disk_evict()
+
+    def _disk_remove(self, key: str):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _disk_evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.name[:-4]))
+                total += stat.st_size
+        entries.sort()
+        for _, size, key in entries:
+            if total <= self.disk_size:
+                break
+            self._disk_remove(key)
+            total -= size
+
+    # ============ API ============
+
+    async def get(self, key: str):
+        """
+        (pdf, link) из кэша или None
+        """
+        record = self._memory_get(key)
+        if record is None:
+            record = await asyncio.to_thread(self._disk_get, key)
+            if record is not None:
+                self._memory_put(key, record)
+        if record is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return record[1], record[2]
+
+    async def put(self, key: str, pdf: bytes, link: str = None):
+        record = (time.time(), pdf, link)
+        self._memory_put(key, record)
+        await asyncio.to_thread(self._disk_put, key, record)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_items": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
+
+
+result_cache = ResultCache()
@@ -0,0 +1,293 @@
+import asyncio
+import heapq
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+# лимиты Telegram: ~30 сообщений в секунду на бота, 1 в секунду в личный чат, 20 в минуту в группу
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", str(20 / 60)))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "5"))
+# через сколько секунд снова проверить, можно ли отправить фоновое сообщение
+SEND_BACKGROUND_RETRY = float(os.getenv("SEND_BACKGROUND_RETRY", "0.1"))
+MAX_MESSAGE_LENGTH = 4096
+
+
+@dataclass
+class Outgoing:
+    method: str
+    kwargs: dict
+    future: asyncio.Future
+    retries: int = 0
+    coalesce: bool = False
+    extra: list = field(default_factory=list)
+    # фоновые (статусы) уходят, только когда в очереди нет обычных сообщений
+    background: bool = False
+    status_key: str = None
+
+
+class OutboundSender:
+    """
+    Центральная очередь исходящих сообщений. Соблюдает общий лимит бота и лимит на чат,
+    при 429 ждет retry_after и повторяет, подряд идущие тексты в один чат склеивает
+    в одно сообщение, если они помещаются в 4096 символов.
+    В каждый чат одновременно идет не больше одной отправки: следующая планируется,
+    когда завершится текущая, поэтому сообщения чата приходят в порядке постановки.
+    Фоновые статусы (send_status) не конкурируют с обычными сообщениями за общий лимит
+    """
+    def __init__(self,
+                 global_rate: float = SEND_GLOBAL_RATE,
+                 chat_rate: float = SEND_CHAT_RATE,
+                 group_rate: float = SEND_GROUP_RATE,
+                 max_retries: int = SEND_MAX_RETRIES):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.bot = None
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failed = 0
+        self._chats = {}
+        self._next_chat_time = {}
+        self._heap = []
+        self._scheduled = set()
+        self._global_next = 0.0
+        self._inflight = set()
+        # чаты, в которые сейчас идет отправка
+        self._busy = set()
+        self._normal_queued = 0
+        self._wakeup = None
+        self._task = None
+
+    @property
+    def depth(self) -> int:
+        return sum(len(items) for items in self._chats.values())
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "chats": len(self._chats),
+            "inflight": len(self._inflight),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    # ============ постановка в очередь ============
+
+    def _enqueue(self, chat_id: int, item: Outgoing, front: bool = False):
+        items = self._chats.setdefault(chat_id, deque())
+        if not item.background:
+            self._normal_queued += 1
+            if any(queued.background for queued in items):
+                # обычное сообщение (например, результат) делает неотправленные статусы чата лишними
+                for queued in [queued for queued in items if queued.background]:
+                    items.remove(queued)
+                    if not queued.future.done():
+                        queued.future.set_result(None)
+        if front:
+            items.appendleft(item)
+        else:
+            items.append(item)
+        self._schedule(chat_id)
+
+    def _schedule(self, chat_id: int):
+        # занятый чат запланирует _send, когда текущая отправка завершится
+        if chat_id in self._scheduled or chat_id in self._busy:
+            return
+        loop = asyncio.get_running_loop()
+        when = max(loop.time(), self._next_chat_time.get(chat_id, 0.0))
+        heapq.heappush(self._heap, (when, chat_id))
+        self._scheduled.add(chat_id)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def submit(self, method: str, chat_id: int, coalesce: bool = False, **kwargs) -> asyncio.Future:
+        """
+        Ставит вызов метода бота в очередь, возвращает future с результатом
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(chat_id, Outgoing(method=method, kwargs=dict(kwargs, chat_id=chat_id),
+                                        future=future, coalesce=coalesce))
+        return future
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        # склеивать можно только простые тексты без клавиатур
+        coalesce = "reply_markup" not in kwargs
+        return await self.submit("send_message", chat_id, coalesce=coalesce, text=text, **kwargs)
+
+    async def send_document(self, chat_id: int, document, **kwargs):
+        return await self.submit("send_document", chat_id, document=document, **kwargs)
+
+    def send_status(self, chat_id: int, text: str, key: str = "status", **kwargs) -> asyncio.Future:
+        """
+        Фоновое статусное сообщение (позиция в очереди и т.п.): уходит, когда обычных сообщений
+        в очереди нет. Еще не отправленный статус с тем же key заменяется новым текстом
+        """
+        for item in self._chats.get(chat_id, ()):
+            if item.status_key == key:
+                item.kwargs.update(kwargs, text=text)
+                return item.future
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(chat_id, Outgoing(method="send_message", kwargs=dict(kwargs, chat_id=chat_id, text=text),
+                                        future=future, background=True, status_key=key))
+        return future
+
+    def broadcast(self, chat_ids, text: str, **kwargs) -> list:
+        """
+        Рассылка одного текста в несколько чатов, возвращает future на каждый чат
+        """
+        coalesce = "reply_markup" not in kwargs
+        return [self.submit("send_message", chat_id, coalesce=coalesce, text=text, **kwargs)
+                for chat_id in chat_ids]
+
+    # ============ планировщик ============
+
+    def _chat_interval(self, chat_id: int) -> float:
+        rate = self.group_rate if chat_id < 0 else self.chat_rate
+        return 1 / rate if rate > 0 else 0.0
+
+    def _take(self, chat_id: int) -> Outgoing:
+        items = self._chats[chat_id]
+        item = items.popleft()
+        if not item.background:
+            self._normal_queued -= 1
+        if item.coalesce:
+            text = item.kwargs["text"]
+            while items and items[0].coalesce and item.method == items[0].method:
+                following = items[0]
+                other = {k: v for k, v in following.kwargs.items() if k != "text"}
+                mine = {k: v for k, v in item.kwargs.items() if k != "text"}
+                merged = text + "\n\n" + following.kwargs["text"]
+                if other != mine or len(merged) > MAX_MESSAGE_LENGTH:
+                    break
+                items.popleft()
+                self._normal_queued -= 1
+                text = merged
+                item.extra.append(following.future)
+                self.coalesced += 1
+            item.kwargs["text"] = text
+        if not items:
+            del self._chats[chat_id]
+        return item
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            when, chat_id = self._heap[0]
+            delay = max(when, self._global_next) - loop.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            self._scheduled.discard(chat_id)
+            if chat_id not in self._chats:
+                continue
+            now = loop.time()
+            if self._chats[chat_id][0].background and self._normal_queued:
+                # статус подождет, пока уйдут обычные сообщения
+                self._next_chat_time[chat_id] = max(self._next_chat_time.get(chat_id, 0.0),
+                                                    now + SEND_BACKGROUND_RETRY)
+                self._schedule(chat_id)
+                continue
+            item = self._take(chat_id)
+            self._global_next = now + (1 / self.global_rate if self.global_rate > 0 else 0.0)
+            self._next_chat_time[chat_id] = now + self._chat_interval(chat_id)
+            self._busy.add(chat_id)
+            task = asyncio.create_task(self._send(chat_id, item))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, chat_id: int, item: Outgoing):
+        try:
+            await self._deliver(chat_id, item)
+        finally:
+            self._busy.discard(chat_id)
+            if chat_id in self._chats:
+                self._schedule(chat_id)
+
+    async def _deliver(self, chat_id: int, item: Outgoing):
+        futures = [item.future] + item.extra
+        try:
+            result = await getattr(self.bot, item.method)(**item.kwargs)
+        except TelegramRetryAfter as e:
+            loop = asyncio.get_running_loop()
+            if item.retries >= self.max_retries:
+                self._fail(futures, e)
+                return
+            item.retries += 1
+            self.retried += 1
+            # флуд-контроль: притормаживаем и этот чат, и весь бот
+            resume = loop.time() + e.retry_after
+            self._next_chat_time[chat_id] = max(self._next_chat_time.get(chat_id, 0.0), resume)
+            self._global_next = max(self._global_next, resume)
+            # чат еще занят, поэтому сообщение встает первым и уйдет раньше всех, что пришли после него
+            self._enqueue(chat_id, item, front=True)
+            return
+        except Exception as e:
+            self._fail(futures, e)
+            return
+        self.sent += 1
+        for future in futures:
+            if not future.done():
+                future.set_result(result)
+
+    def _fail(self, futures: list, error: Exception):
+        self.failed += 1
+        logging.error(f"Не удалось отправить сообщение: {error!r}")
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+    # ============ жизненный цикл ============
+
+    async def start(self, bot: Bot):
+        self.bot = bot
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, drain_timeout: float = 10):
+        """
+        Дожидается отправки очереди (не дольше drain_timeout) и останавливает планировщик
+        """
+        if self._task is None:
+            return
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + drain_timeout
+        while (self._chats or self._inflight) and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for items in self._chats.values():
+            self._fail([item.future for item in items], RuntimeError("sender stopped"))
+        self._chats.clear()
+        self._busy.clear()
+        self._normal_queued = 0
+
+
+sender = OutboundSender()
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Update
+from dotenv import load_dotenv
+
+from app.webhook import BOT_MODE, run_webhook
+
+load_dotenv(override=True)
+
+# число процессов-воркеров, 1 - обычный режим одним процессом
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+# сколько апдейтов может ждать в очереди одного воркера, дальше фронт притормаживает прием
+SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", "10000"))
+# как часто фронт проверяет, живы ли воркеры
+SHARD_CHECK_INTERVAL = float(os.getenv("SHARD_CHECK_INTERVAL", "5"))
+SHARD_STOP_TIMEOUT = float(os.getenv("SHARD_STOP_TIMEOUT", "60"))
+
+_STOP = None
+
+
+class ShardRouter(BaseMiddleware):
+    """
+    Outer-middleware диспетчера фронта: хендлеры не вызываются,
+    апдейт уходит воркеру, которому принадлежит пользователь
+    """
+    def __init__(self, pool: "WorkerPool"):
+        self.pool = pool
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        key = user.id if user else (chat.id if chat else 0)
+        await self.pool.route(key, event.model_dump(mode="json", by_alias=True, exclude_none=True))
+        return True
+
+
+class WorkerPool:
+    """
+    Процессы-воркеры и очереди апдейтов к ним.
+    Пользователь всегда попадает в один и тот же воркер (user_id по модулю числа воркеров),
+    на каждый воркер один пересылающий таск - порядок апдейтов пользователя сохраняется
+    """
+    def __init__(self, workers: int, token: str, api: TelegramAPIServer,
+                 queue_size: int = SHARD_QUEUE_SIZE,
+                 check_interval: float = SHARD_CHECK_INTERVAL):
+        self.workers = workers
+        self.token = token
+        self.api = api
+        self.queue_size = queue_size
+        self.check_interval = check_interval
+        self.routed = [0] * workers
+        self.restarts = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._queues = [self._context.Queue(queue_size) for _ in range(workers)]
+        self._processes = [None] * workers
+        self._outboxes = []
+        self._tasks = []
+
+    def shard(self, key: int) -> int:
+        return key % self.workers
+
+    async def route(self, key: int, update: dict):
+        index = self.shard(key)
+        self.routed[index] += 1
+        await self._outboxes[index].put((key, update))
+
+    def _spawn(self, index: int):
+        process = self._context.Process(
+            target=run_worker,
+            args=(index, self.workers, self._queues[index], self.token, self.api),
+            name=f"bot-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+        logging.info(f"Воркер {index} запущен, pid {process.pid}")
+
+    async def _forward(self, index: int):
+        """
+        Перекладывает апдейты в очередь процесса, при заполненной очереди ждет в потоке
+        """
+        outbox = self._outboxes[index]
+        shard_queue = self._queues[index]
+        while True:
+            item = await outbox.get()
+            try:
+                shard_queue.put_nowait(item)
+            except queue.Full:
+                await asyncio.to_thread(shard_queue.put, item)
+            finally:
+                outbox.task_done()
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            for index, process in enumerate(self._processes):
+                if process is not None and not process.is_alive():
+                    logging.error(f"Воркер {index} завершился с кодом {process.exitcode}, перезапуск")
+                    self.restarts += 1
+                    self._spawn(index)
+
+    async def start(self):
+        self._outboxes = [asyncio.Queue(self.queue_size) for _ in range(self.workers)]
+        for index in range(self.workers):
+            self._spawn(index)
+        self._tasks = [asyncio.create_task(self._forward(index)) for index in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._watch()))
+
+    async def stop(self, timeout: float = SHARD_STOP_TIMEOUT):
+        """
+        Досылает принятые апдейты и ждет, пока воркеры обработают очередь и остановятся
+        """
+        try:
+            await asyncio.wait_for(asyncio.gather(*(outbox.join() for outbox in self._outboxes)), timeout)
+        except asyncio.TimeoutError:
+            logging.warning("Не все апдейты переданы воркерам до остановки")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for shard_queue in self._queues:
+            await asyncio.to_thread(shard_queue.put, _STOP)
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                logging.warning(f"Воркер {index} не остановился за {timeout} с, завершаем принудительно")
+                process.terminate()
+                await asyncio.to_thread(process.join)
+            self._processes[index] = None
+
+
+class ShardWorker:
+    """
+    Обработка апдейтов в процессе-воркере: апдейты разных пользователей идут параллельно,
+    одного пользователя - строго по очереди, в порядке прихода
+    """
+    def __init__(self, dp: Dispatcher, bot: Bot):
+        self.dp = dp
+        self.bot = bot
+        self._tails = {}
+
+    def feed(self, key: int, update: dict):
+        previous = self._tails.get(key)
+        task = asyncio.create_task(self._feed(previous, update))
+        self._tails[key] = task
+        task.add_done_callback(lambda done: self._tails.pop(key, None) if self._tails.get(key) is done else None)
+
+    async def _feed(self, previous: asyncio.Task, update: dict):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await self.dp.feed_raw_update(self.bot, update)
+        except Exception as e:
+            logging.error(f"Ошибка обработки апдейта {update.get('update_id')}: {e}", exc_info=True)
+
+    async def run(self, updates):
+        """
+        Читает очередь процесса до сигнала остановки и дожидается начатой обработки
+        """
+        stopped = False
+        while not stopped:
+            items = [await asyncio.to_thread(updates.get)]
+            # все, что уже лежит в очереди, забирается без лишних переходов в поток
+            try:
+                while len(items) < 100:
+                    items.append(updates.get_nowait())
+            except queue.Empty:
+                pass
+            for item in items:
+                if item is _STOP:
+                    stopped = True
+                    break
+                self.feed(*item)
+        if self._tails:
+            await asyncio.wait(list(self._tails.values()))
+
+
+def run_worker(index: int, workers: int, updates, token: str, api: TelegramAPIServer):
+    """
+    Точка входа процесса-воркера. Ctrl+C получает вся группа процессов,
+    останавливает воркеры фронт - после того как передаст им принятые апдейты
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_main(index, workers, updates, token, api))
+
+
+async def _worker_main(index: int, workers: int, updates, token: str, api: TelegramAPIServer):
+    # app.main подтягивает хендлеры и сервисы, в процессе фронта они не нужны
+    from app.main import bot_runtime
+    from app.middlewares.metrics import TelegramMetricsMiddleware
+    from app.services.metrics import METRICS_PORT
+    from app.sql_database.User import db_user
+
+    bot = Bot(token=token, session=AiohttpSession(api=api))
+    bot.session.middleware(TelegramMetricsMiddleware())
+    # у каждого воркера свой /metrics: METRICS_PORT, METRICS_PORT + 1, ...
+    metrics_port = METRICS_PORT + index if METRICS_PORT else 0
+    try:
+        # общие на весь бот лимиты bot_runtime делит между воркерами
+        async with bot_runtime(bot, metrics_port=metrics_port, shards=workers) as dp:
+            workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+            await dp.emit_startup(bot=bot, **workflow_data)
+            # пользователей регистрируют и другие воркеры - кэш сверяется с базой
+            db_user.start_watch()
+            logging.info(f"Воркер {index}/{workers} готов")
+            try:
+                await ShardWorker(dp, bot).run(updates)
+            finally:
+                await dp.emit_shutdown(bot=bot, **workflow_data)
+    finally:
+        await bot.session.close()
+
+
+def create_front_dispatcher(pool: WorkerPool) -> Dispatcher:
+    """
+    Диспетчер фронта без хендлеров и FSM - только раскладывает апдейты по воркерам
+    """
+    dp = Dispatcher(disable_fsm=True)
+    dp.update.outer_middleware(ShardRouter(pool))
+    return dp
+
+
+async def run_front(bot: Bot, workers: int = BOT_WORKERS):
+    """
+    Фронт шардированного режима: принимает апдейты (polling или вебхук)
+    и раскладывает их по процессам-воркерам. База пользователей и FSM - общие sqlite в WAL;
+    состояние FSM пользователя трогает только его воркер, поэтому его кэш остается верным
+    """
+    pool = WorkerPool(workers, bot.token, bot.session.api)
+    dp = create_front_dispatcher(pool)
+    await pool.start()
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp)
+        else:
+            # апдейты раскладываются последовательно, чтобы не перемешать порядок
+            await dp.start_polling(bot, handle_as_tasks=False, close_bot_session=False)
+    finally:
+        await pool.stop()
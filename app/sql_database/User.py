@@ -1,61 +1,165 @@
+import asyncio
+import queue
 import sqlite3
+import threading
 import os
 from dotenv import load_dotenv
 
+from app.sql_database.user_cache import UserCache
+from app.services.metrics import DB_QUERY_SECONDS
+
 load_dotenv(override=True)
 
 ADMINS = [346235776]
 
+# права, которые дает регистрация, и права, считающиеся админскими (плюс все из ADMINS)
+DEFAULT_ACCESS_RIGHTS = "user"
+ADMIN_ACCESS_RIGHTS = ("admin", "duty_admin")
+
+DB_PATH = os.getenv("USER_DB_PATH", "app/sql_database/base.db")
+DB_POOL_SIZE = int(os.getenv("USER_DB_POOL_SIZE", "4"))
+# ограничение sqlite на число параметров в одном запросе
+SQL_VARIABLES_LIMIT = 900
+# как часто проверять, не изменил ли базу другой процесс (шардированный режим)
+USER_CACHE_WATCH_INTERVAL = float(os.getenv("USER_CACHE_WATCH_INTERVAL", "1"))
+
+
 class UserDatabase:
-    def __init__(self):
-        self.connection = sqlite3.connect('app/sql_database/base.db')
-        self.cursor = self.connection.cursor()
-        self.cursor.execute("""
+    """
+    Асинхронное хранилище пользователей.
+    Запросы выполняются в пуле потоков на небольшом пуле sqlite-соединений (WAL),
+    поэтому event loop не блокируется на запросах и fsync.
+    """
+    def __init__(self, path: str = DB_PATH, pool_size: int = DB_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._connections = []
+        self._lock = threading.Lock()
+        self._initialized = False
+        self.cache = UserCache()
+        self._cache_lock = asyncio.Lock()
+        self._watch_connection = None
+        self._watch_task = None
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=30000")
+        return connection
+
+    def _init_schema(self, connection: sqlite3.Connection):
+        # воркеры шардированного режима мигрируют базу одновременно: проверка и ALTER
+        # идут под блокировкой записи, остальные ждут ее по busy_timeout
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._migrate(connection)
+        except Exception:
+            connection.rollback()
+            raise
+        connection.commit()
+
+    @staticmethod
+    def _migrate(connection: sqlite3.Connection):
+        connection.execute("""
             CREATE TABLE IF NOT EXISTS users(
-                user_id INTEGER PRIMARY KEY, 
+                user_id INTEGER PRIMARY KEY,
                 username TEXT NOT NULL,
                 telegram_username TEXT)
             """)
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(users)")]
+        if "access_rights" not in columns:
+            try:
+                connection.execute(
+                    f"ALTER TABLE users ADD COLUMN access_rights TEXT NOT NULL DEFAULT '{DEFAULT_ACCESS_RIGHTS}'"
+                )
+            except sqlite3.OperationalError as e:
+                # колонку уже добавил другой процесс - миграция выполнена
+                if "duplicate column name" not in str(e):
+                    raise
+        # строки без роли или с неизвестной ролью - обычные пользователи
+        connection.execute(
+            "UPDATE users SET access_rights=? WHERE access_rights IS NULL OR access_rights NOT IN (?, ?, ?)",
+            (DEFAULT_ACCESS_RIGHTS, DEFAULT_ACCESS_RIGHTS, *ADMIN_ACCESS_RIGHTS),
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_users_access_rights ON users(access_rights)")
         # if not self.exists(user_id=346235776):
-        #     self.insert(user_id=346235776, 
-        #                 username="Загадка Амелия Вадимовна", 
+        #     self.insert(user_id=346235776,
+        #                 username="Загадка Амелия Вадимовна",
         #                 telegram_username="tainella",
         #                 approved=1,
         #                 access_rights="user")
-        self.connection.commit()
-    
-    def __del__(self):
-        self.connection.close()
-
-    def exists(self, user_id: int) -> bool:
-        self.cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-        row = self.cursor.fetchone()
-        return row is not None
 
-    def delete(self, user_id: int) -> bool:
-        if self.exists(user_id):
-            self.cursor.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
-            self.connection.commit()
-            return True
-        else:
-            return False
+    def _acquire(self) -> sqlite3.Connection:
+        """
+        Берет соединение из пула, при необходимости создает новое (не больше pool_size)
+        """
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._connections) < self.pool_size:
+                connection = self._connect()
+                if not self._initialized:
+                    self._init_schema(connection)
+                    self._initialized = True
+                self._connections.append(connection)
+                return connection
+        return self._pool.get()
 
-    # def is_approved(self, user_id: int) -> bool:
-    #     """
-    #     Проверяет одобрен ли пользвоатель (1)
-    #     """
-    #     row = self.cursor.execute("SELECT approved FROM users WHERE user_id = ?", (user_id,)).fetchone()
-    #     if row is None:
-    #         return False
-    #     return bool(row[0])    
+    def _release(self, connection: sqlite3.Connection):
+        self._pool.put(connection)
 
-    def insert(self, user_id: int, username: str, telegram_username: str):
+    def _run(self, func, *args):
+        connection = self._acquire()
+        try:
+            return func(connection, *args)
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            self._release(connection)
+
+    async def _execute(self, func, *args):
+        with DB_QUERY_SECONDS.time(method=func.__name__.lstrip("_")):
+            return await asyncio.to_thread(self._run, func, *args)
+
+    async def connect(self):
         """
-        Регистрация
+        Открывает соединение, создает схему и прогревает кэш - вызывается при старте бота
         """
-        if self.exists(user_id):
-            return False
+        await self._get_cache()
+
+    def close(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+        with self._lock:
+            if self._watch_connection is not None:
+                self._watch_connection.close()
+                self._watch_connection = None
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+            self._pool = queue.LifoQueue(maxsize=self.pool_size)
 
+    # ============ синхронные запросы (выполняются в пуле потоков) ============
+
+    @staticmethod
+    def _exists(connection, user_id: int) -> bool:
+        row = connection.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return row is not None
+
+    @staticmethod
+    def _delete(connection, user_id: int) -> bool:
+        cursor = connection.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+        connection.commit()
+        return cursor.rowcount > 0
+
+    @staticmethod
+    def _insert(connection, user_id: int, username: str, telegram_username: str) -> bool:
         # user_count = self.cursor.execute("SELECT COUNT(*) FROM users").fetchone()[0]
 
         # if user_id in ADMINS:
@@ -68,86 +172,277 @@ class UserDatabase:
         # else:
         #     access_rights = "user"
         #     approved = 1 if user_count == 0 else 0
-        self.cursor.execute(
+        cursor = connection.execute(
             """
-            INSERT INTO users (user_id, username, telegram_username)
+            INSERT OR IGNORE INTO users (user_id, username, telegram_username)
             VALUES (?, ?, ?)
             """,
             (user_id, username, telegram_username)
         )
-        self.connection.commit()
-        return True
+        connection.commit()
+        return cursor.rowcount > 0
+
+    @staticmethod
+    def _select_existing(connection, user_ids: list) -> set:
+        existing = set()
+        for i in range(0, len(user_ids), SQL_VARIABLES_LIMIT):
+            chunk = user_ids[i:i + SQL_VARIABLES_LIMIT]
+            placeholders = ",".join("?" * len(chunk))
+            rows = connection.execute(
+                f"SELECT user_id FROM users WHERE user_id IN ({placeholders})", chunk
+            ).fetchall()
+            existing.update(r[0] for r in rows)
+        return existing
+
+    @classmethod
+    def _delete_many(cls, connection, user_ids: list) -> list:
+        connection.execute("BEGIN IMMEDIATE")
+        existing = cls._select_existing(connection, user_ids)
+        deleted = [user_id for user_id in user_ids if user_id in existing]
+        connection.executemany("DELETE FROM users WHERE user_id = ?", [(user_id,) for user_id in deleted])
+        connection.commit()
+        return deleted
+
+    @classmethod
+    def _insert_many(cls, connection, users: list) -> list:
+        connection.execute("BEGIN IMMEDIATE")
+        existing = cls._select_existing(connection, [u[0] for u in users])
+        new_users = [u for u in users if u[0] not in existing]
+        connection.executemany(
+            """
+            INSERT INTO users (user_id, username, telegram_username)
+            VALUES (?, ?, ?)
+            """,
+            new_users
+        )
+        connection.commit()
+        return [u[0] for u in new_users]
+
+    @staticmethod
+    def _get_user_id_by_tgname(connection, tg_name: str):
+        return connection.execute("""SELECT user_id
+                                     FROM users
+                                     WHERE telegram_username=?
+                                     """, (tg_name,)).fetchone()
+
+    @staticmethod
+    def _approve_user(connection, user_id: int):
+        connection.execute("UPDATE users SET approved = 1 WHERE user_id = ?", (user_id,))
+        connection.commit()
+
+    @staticmethod
+    def _set_access_rights(connection, user_id: int, access_rights: str) -> bool:
+        cursor = connection.execute("""
+                    UPDATE users SET access_rights=? WHERE user_id=?
+                    """, (access_rights, user_id))
+        connection.commit()
+        return cursor.rowcount > 0
+
+    @staticmethod
+    def _get_user(connection, user_id: int):
+        return connection.execute("""
+            SELECT user_id, username, telegram_username
+            FROM users
+            WHERE user_id=?
+        """,
+        (user_id,)).fetchone()
+
+    @staticmethod
+    def _get_all_users(connection):
+        return connection.execute("""
+            SELECT user_id, username, telegram_username
+
+            FROM users
+        """).fetchall()
+
+    @staticmethod
+    def _get_users_page(connection, cursor, limit: int, backward: bool):
+        if backward:
+            condition, order = "WHERE user_id < ?", "DESC"
+        else:
+            condition, order = "WHERE user_id > ?", "ASC"
+        params = (limit,)
+        if cursor is None:
+            condition = ""
+        else:
+            params = (cursor, limit)
+        return connection.execute(f"""
+            SELECT user_id, username, telegram_username
+            FROM users
+            {condition}
+            ORDER BY user_id {order}
+            LIMIT ?
+        """, params).fetchall()
+
+    @staticmethod
+    def _get_all_rights(connection):
+        return connection.execute("""
+            SELECT user_id, access_rights
+            FROM users
+        """).fetchall()
+
+    # ============ кэш id и ролей ============
 
-    def get_user_telegram_link(self, user_id: int) -> str:
-        user = self.get_user(user_id)
+    async def _get_cache(self) -> UserCache:
+        """
+        Возвращает заполненный кэш, при первом обращении загружает его одним запросом
+        """
+        if self.cache.loaded:
+            self.cache.hits += 1
+            return self.cache
+        async with self._cache_lock:
+            if self.cache.loaded:
+                self.cache.hits += 1
+                return self.cache
+            self.cache.misses += 1
+            while not self.cache.loaded:
+                version = self.cache.version
+                rows = await self._execute(self._get_all_rights)
+                self.cache.load(rows, version)
+        return self.cache
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats()
+
+    def _data_version(self) -> int:
+        """
+        PRAGMA data_version меняется, когда базу изменило любое другое соединение
+        """
+        with self._lock:
+            if self._watch_connection is None:
+                self._watch_connection = self._connect()
+            return self._watch_connection.execute("PRAGMA data_version").fetchone()[0]
+
+    async def _watch(self, interval: float):
+        last_version = None
+        while True:
+            version = await asyncio.to_thread(self._data_version)
+            if last_version is not None and version != last_version:
+                self.cache.invalidate()
+            last_version = version
+            await asyncio.sleep(interval)
+
+    def start_watch(self, interval: float = USER_CACHE_WATCH_INTERVAL):
+        """
+        Сбрасывает кэш, когда базу меняет другой процесс - нужно, если ботов несколько.
+        Свои записи идут через другие соединения пула и тоже сбрасывают кэш, он просто перечитается
+        """
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch(interval))
+
+    # ============ публичный асинхронный API ============
+
+    async def exists(self, user_id: int) -> bool:
+        cache = await self._get_cache()
+        return user_id in cache.user_ids
+
+    async def delete(self, user_id: int) -> bool:
+        deleted = await self._execute(self._delete, user_id)
+        self.cache.remove(user_id)
+        return deleted
+
+    async def delete_many(self, user_ids: list) -> list:
+        """
+        Удаление пачки пользователей одной транзакцией.
+        Возвращает id, которые действительно были удалены
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return []
+        deleted = await self._execute(self._delete_many, user_ids)
+        for user_id in deleted:
+            self.cache.remove(user_id)
+        return deleted
+
+    async def insert_many(self, users: list) -> list:
+        """
+        Регистрация пачки пользователей одной транзакцией.
+        users - список (user_id, username, telegram_username).
+        Возвращает id зарегистрированных, уже существующие пропускаются
+        """
+        unique_users = {}
+        for user_id, username, telegram_username in users:
+            unique_users.setdefault(user_id, (user_id, username, telegram_username))
+        if not unique_users:
+            return []
+        inserted = await self._execute(self._insert_many, list(unique_users.values()))
+        for user_id in inserted:
+            self.cache.add(user_id, DEFAULT_ACCESS_RIGHTS)
+        return inserted
+
+    # def is_approved(self, user_id: int) -> bool:
+    #     """
+    #     Проверяет одобрен ли пользвоатель (1)
+    #     """
+    #     row = self.cursor.execute("SELECT approved FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    #     if row is None:
+    #         return False
+    #     return bool(row[0])
+
+    async def insert(self, user_id: int, username: str, telegram_username: str):
+        """
+        Регистрация
+        """
+        inserted = await self._execute(self._insert, user_id, username, telegram_username)
+        if inserted:
+            self.cache.add(user_id, DEFAULT_ACCESS_RIGHTS)
+        return inserted
+
+    async def get_user_telegram_link(self, user_id: int) -> str:
+        user = await self.get_user(user_id)
         if not user:
             return f"ID: {user_id}"
-        
+
         username = user.get("telegram_username")
         if username:
             return f"@{username}"
         return f'[{user.get("username", "Пользователь")}](https://t.me/{user_id})'
-    
-    def get_user_id_by_tgname(self, tg_name: str) -> int:
-        result = self.cursor.execute("""SELECT user_id
-                                     FROM users
-                                     WHERE telegram_username=?
-                                     """, (tg_name,)).fetchone()
+
+    async def get_user_id_by_tgname(self, tg_name: str) -> int:
+        result = await self._execute(self._get_user_id_by_tgname, tg_name)
         if result:
             return int(result[0])
         else:
             return None
 
-    def approve_user(self, user_id: int):
+    async def approve_user(self, user_id: int):
         """
         Одобрение -> 1
         """
-        self.cursor.execute("UPDATE users SET approved = 1 WHERE user_id = ?", (user_id))
-        self.connection.commit()
+        await self._execute(self._approve_user, user_id)
 
-    def set_access_rights(self, user_id : int, access_rights: str):
+    async def set_access_rights(self, user_id : int, access_rights: str):
         """
         установка прав
         """
-        self.cursor.execute("""
-                    UPDATE users SET access_rights=? WHERE user_id=?   
-                    """, (access_rights, user_id))
-        self.connection.commit()
+        if await self._execute(self._set_access_rights, user_id, access_rights):
+            self.cache.set_rights(user_id, access_rights)
 
-    def get_user(self, user_id: int) -> dict:
+    async def get_user(self, user_id: int) -> dict:
         """
         получение данных пользователя
         """
-        row = self.cursor.execute("""
-            SELECT user_id, username, telegram_username
-            FROM users
-            WHERE user_id=?
-        """,
-        (user_id,)).fetchone()
+        row = await self._execute(self._get_user, user_id)
         if not row:
             return {}
         return {"user_id": row[0],
                 "username": row[1],
-                "telegram_username": row[2],  
+                "telegram_username": row[2],
                 }
 
-    # def get_duty_admin_id(self) -> int:
-    #     """
-    #     id дежурного админа. Если такого нет, то 0
-    #     """
-    #     self.cursor.execute("SELECT user_id FROM users WHERE access_rights = 'user'")
-    #     row = self.cursor.fetchone()
-    #     return row[0] if row else 0
-    
-    def get_all_users(self) -> dict:
+    async def get_duty_admin_id(self) -> int:
+        """
+        id дежурного админа. Если такого нет, то 0
+        """
+        cache = await self._get_cache()
+        duty_admins = cache.with_rights("duty_admin")
+        return min(duty_admins) if duty_admins else 0
+
+    async def get_all_users(self) -> list:
         """
         информация по всем пользателям
         """
-        rows = self.cursor.execute("""
-            SELECT user_id, username, telegram_username
-                                    
-            FROM users
-        """).fetchall()
+        rows = await self._execute(self._get_all_users)
 
         result = []
         for r in rows:
@@ -158,21 +453,46 @@ class UserDatabase:
             }
             result.append(user_dict)
         return result
-    
-    def get_admins_id(self) -> list:
+
+    async def get_users_page(self, cursor: int = None, limit: int = 20, backward: bool = False) -> tuple:
+        """
+        Страница пользователей по ключу user_id (keyset-пагинация).
+        cursor - id, после которого (или до которого, если backward) начинается страница.
+        Возвращает (пользователи по возрастанию id, есть ли еще записи в этом направлении)
+        """
+        rows = await self._execute(self._get_users_page, cursor, limit + 1, backward)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if backward:
+            rows.reverse()
+        users = [
+            {"user_id": r[0], "username": r[1], "telegram_username": r[2]}
+            for r in rows
+        ]
+        return users, has_more
+
+    async def get_admins_id(self) -> list:
         """
         информация по всем админам
         """
-        result = self.cursor.execute("""
-            SELECT user_id
-            FROM users
-            WHERE access_rights IN ('user')
-        """).fetchall()
-        result = [r[0] for r in result]
-        return result
-    
+        cache = await self._get_cache()
+        return list(cache.with_rights(*ADMIN_ACCESS_RIGHTS) | set(ADMINS))
+
+    async def is_admin(self, user_id: int) -> bool:
+        if user_id in ADMINS:
+            return True
+        cache = await self._get_cache()
+        return cache.rights.get(user_id) in ADMIN_ACCESS_RIGHTS
+
+
+# Общее для всего приложения хранилище пользователей
+db_user = UserDatabase()
+
 if __name__ == '__main__':
-    db_user = UserDatabase()
-    print(db_user.get_admins_id())
-    if 346235776 in db_user.get_admins_id():
-        print('OK')
+    async def _main():
+        print(await db_user.get_admins_id())
+        if await db_user.is_admin(346235776):
+            print('OK')
+        print(db_user.cache_stats())
+        db_user.close()
+    asyncio.run(_main())
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+FSM_DB_PATH = os.getenv("FSM_DB_PATH", "app/sql_database/fsm.db")
+# через сколько секунд без активности брошенный сценарий забывается
+FSM_TTL = float(os.getenv("FSM_TTL", str(24 * 60 * 60)))
+# сколько ключей держим в памяти, остальное читается из sqlite
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+FSM_CLEANUP_INTERVAL = float(os.getenv("FSM_CLEANUP_INTERVAL", "600"))
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram в sqlite: состояния переживают перезапуск,
+    брошенные сценарии удаляются по TTL, в памяти - только ограниченный LRU-кэш
+    """
+    def __init__(self,
+                 path: str = FSM_DB_PATH,
+                 ttl: float = FSM_TTL,
+                 cache_size: int = FSM_CACHE_SIZE,
+                 cleanup_interval: float = FSM_CLEANUP_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.cleanup_interval = cleanup_interval
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._cache = OrderedDict()
+        self._connection = None
+        self._lock = threading.Lock()
+        self._task = None
+
+    # ============ sqlite (выполняется в пуле потоков) ============
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=30000")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS fsm(
+                    key TEXT PRIMARY KEY,
+                    state TEXT,
+                    data TEXT NOT NULL DEFAULT '{}',
+                    updated_at REAL NOT NULL)
+                """)
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_fsm_updated_at ON fsm(updated_at)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _run(self, func, *args):
+        with self._lock:
+            connection = self._connect()
+            try:
+                return func(connection, *args)
+            except Exception:
+                connection.rollback()
+                raise
+
+    async def _execute(self, func, *args):
+        return await asyncio.to_thread(self._run, func, *args)
+
+    async def connect(self):
+        """
+        Открывает базу и создает схему - вызывается при старте бота
+        """
+        await asyncio.to_thread(self._run, lambda connection: None)
+
+    @staticmethod
+    def _select(connection, key: str):
+        return connection.execute(
+            "SELECT state, data, updated_at FROM fsm WHERE key = ?", (key,)
+        ).fetchone()
+
+    @staticmethod
+    def _write(connection, key: str, state: Optional[str], data: str, updated_at: float):
+        if state is None and data == "{}":
+            connection.execute("DELETE FROM fsm WHERE key = ?", (key,))
+        else:
+            connection.execute("""
+                INSERT INTO fsm (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    state=excluded.state, data=excluded.data, updated_at=excluded.updated_at
+                """, (key, state, data, updated_at))
+        connection.commit()
+
+    @staticmethod
+    def _delete_expired(connection, deadline: float) -> int:
+        cursor = connection.execute("DELETE FROM fsm WHERE updated_at < ?", (deadline,))
+        connection.commit()
+        return cursor.rowcount
+
+    # ============ кэш ============
+
+    def _remember(self, key: str, record: tuple):
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _expired(self, updated_at: float) -> bool:
+        return self.ttl > 0 and updated_at < time.time() - self.ttl
+
+    async def _load(self, key: str) -> tuple:
+        """
+        (state, data json) по ключу, просроченные записи считаются пустыми
+        """
+        record = self._cache.get(key)
+        if record is None:
+            row = await self._execute(self._select, key)
+            record = row if row is not None else (None, "{}", time.time())
+        if self._expired(record[2]):
+            record = (None, "{}", time.time())
+        self._remember(key, record)
+        return record
+
+    async def _save(self, key: str, state: Optional[str], data: str):
+        record = (state, data, time.time())
+        self._remember(key, record)
+        await self._execute(self._write, key, *record)
+
+    # ============ BaseStorage ============
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        key = self.key_builder.build(key)
+        state = state.state if isinstance(state, State) else state
+        _, data, _ = await self._load(key)
+        await self._save(key, state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _, _ = await self._load(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        key = self.key_builder.build(key)
+        state, _, _ = await self._load(key)
+        await self._save(key, state, json.dumps(data, ensure_ascii=False))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data, _ = await self._load(self.key_builder.build(key))
+        return json.loads(data)
+
+    async def purge_expired(self) -> int:
+        """
+        Удаляет брошенные сценарии старше ttl, возвращает число удаленных
+        """
+        deadline = time.time() - self.ttl
+        for key in [k for k, record in self._cache.items() if record[2] < deadline]:
+            del self._cache[key]
+        return await self._execute(self._delete_expired, deadline)
+
+    async def _cleanup(self):
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                deleted = await self.purge_expired()
+                if deleted:
+                    logging.info(f"FSM: удалено просроченных состояний: {deleted}")
+            except Exception as e:
+                logging.error(f"FSM: ошибка очистки: {e}")
+
+    def start(self):
+        if self._task is None and self.ttl > 0:
+            self._task = asyncio.create_task(self._cleanup())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # в потоке: блокировка дождется записей, которые еще выполняются в to_thread
+        await asyncio.to_thread(self._close_connection)
+        self._cache.clear()
+
+    def _close_connection(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+fsm_storage = SQLiteStorage()
@@ -0,0 +1,72 @@
+from collections import defaultdict
+
+
+class UserCache:
+    """
+    Кэш зарегистрированных id и ролей пользователей в памяти процесса.
+    Заполняется одним запросом, дальше обновляется при записи (write-through),
+    проверки членства - O(1) по множествам.
+    """
+    def __init__(self):
+        self.loaded = False
+        self.version = 0
+        self.user_ids = set()
+        self.rights = {}
+        self.roles = defaultdict(set)
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, rows, version: int) -> bool:
+        """
+        Заполняет кэш строками (user_id, access_rights).
+        Если во время чтения была запись (сменилась версия), кэш не помечается загруженным
+        """
+        if version != self.version:
+            return False
+        self.user_ids = set()
+        self.rights = {}
+        self.roles = defaultdict(set)
+        for user_id, access_rights in rows:
+            self._put(user_id, access_rights)
+        self.loaded = True
+        return True
+
+    def _put(self, user_id: int, access_rights: str):
+        self.user_ids.add(user_id)
+        self.rights[user_id] = access_rights
+        self.roles[access_rights].add(user_id)
+
+    def add(self, user_id: int, access_rights: str):
+        self.version += 1
+        self.remove(user_id, bump=False)
+        self._put(user_id, access_rights)
+
+    def remove(self, user_id: int, bump: bool = True):
+        if bump:
+            self.version += 1
+        self.user_ids.discard(user_id)
+        old_rights = self.rights.pop(user_id, None)
+        if old_rights is not None:
+            self.roles[old_rights].discard(user_id)
+
+    def set_rights(self, user_id: int, access_rights: str):
+        self.add(user_id, access_rights)
+
+    def invalidate(self):
+        self.version += 1
+        self.loaded = False
+
+    def with_rights(self, *access_rights: str) -> set:
+        result = set()
+        for rights in access_rights:
+            result |= self.roles.get(rights, set())
+        return result
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "users": len(self.user_ids),
+        }
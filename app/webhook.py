@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import os
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+# polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# внешний адрес, на который Telegram шлет апдейты, например https://bot.example.com
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+
+def create_webhook_app(bot: Bot, dp: Dispatcher,
+                       path: str = WEBHOOK_PATH,
+                       secret_token: str = WEBHOOK_SECRET,
+                       **kwargs) -> web.Application:
+    """
+    aiohttp-приложение, которое проверяет secret token, сразу отвечает 200
+    и обрабатывает апдейт хендлерами в фоне
+    """
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=secret_token,
+        **kwargs,
+    ).register(app, path=path)
+    setup_application(app, dp, bot=bot, **kwargs)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher,
+                      host: str = WEBHOOK_HOST,
+                      port: int = WEBHOOK_PORT,
+                      url: str = WEBHOOK_URL,
+                      path: str = WEBHOOK_PATH,
+                      secret_token: str = WEBHOOK_SECRET,
+                      **kwargs):
+    """
+    Поднимает webhook-сервер, регистрирует вебхук в Telegram и работает до отмены
+    """
+    if not url:
+        raise ValueError("WEBHOOK_URL is empty or not set!")
+    if not secret_token:
+        logging.warning("WEBHOOK_SECRET is not set, webhook requests are not verified")
+
+    app = create_webhook_app(bot, dp, path=path, secret_token=secret_token, **kwargs)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+    try:
+        await bot.set_webhook(
+            url=url.rstrip("/") + path,
+            secret_token=secret_token,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=True,
+        )
+        logging.info(f"Webhook server listening on {host}:{port}{path}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
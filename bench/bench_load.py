@@ -0,0 +1,338 @@
+"""
+Нагрузочный end-to-end тест бота без сети: фейковый Bot API (bench/fake_telegram.py)
+и заглушка бэкенда нумерологии (bench/fake_numerology.py) работают в отдельном потоке,
+бот - настоящий диспетчер и роутеры из app/main.py в режиме polling.
+Каждый пользователь проходит /auth -> ФИО -> /start -> "Сеанс нумерологии" -> анкета -> pdf.
+
+Базы, кэш результатов, анкеты и логи пишутся во временный каталог. Лимиты отправки и
+глобальный лимит входящих по умолчанию сняты, --real-limits оставляет боевые.
+
+python bench/bench_load.py --users 200 --rate 50 --backend-latency 0.2 --max-p95-ms 3000
+python bench/bench_load.py --users 1000 --rate 0 --shards 4
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+sys.path.append(str(ROOT_DIR / "bench"))
+
+TOKEN = "42:FAKE"
+USER_ID_BASE = 10_000_000
+# шаг сценария -> (текст сообщения, метод ответа бота, фрагмент текста/подписи ответа)
+STEPS = (
+    ("auth", "/auth", "sendMessage", "ФИО"),
+    ("name", None, "sendMessage", "данные записаны"),
+    ("start", "/start", "sendMessage", None),
+    ("numerology", "Сеанс нумерологии", "sendDocument", None),
+    ("upload", None, "sendMessage", "анкета принята"),
+    ("pdf", None, "sendDocument", "связанный сеанс"),
+)
+UNLIMITED = {
+    "THROTTLING_GLOBAL_RATE": "1000000",
+    "THROTTLING_GLOBAL_BURST": "1000000",
+    "SEND_GLOBAL_RATE": "1000000",
+    "SEND_CHAT_RATE": "1000000",
+    "SEND_GROUP_RATE": "1000000",
+}
+
+
+def configure_env(work_dir: str, args):
+    """
+    Настройки приложения читаются при импорте модулей, поэтому env задается до импорта app
+    """
+    mapping_path = os.path.join(work_dir, "field_mapping.json")
+    env = {
+        "BOT_TOKEN": TOKEN,
+        "USER_DB_PATH": os.path.join(work_dir, "base.db"),
+        "FSM_DB_PATH": os.path.join(work_dir, "fsm.db"),
+        "RESULT_CACHE_DIR": os.path.join(work_dir, "cache"),
+        "USER_INFO_DIR": os.path.join(work_dir, "users"),
+        "LOG_DIR": os.path.join(work_dir, "logs"),
+        "FIELD_MAPPING_PATH": mapping_path,
+        "NUMEROLOGY_WORKERS": str(args.workers),
+        "METRICS_PORT": "0",
+    }
+    if not args.real_limits:
+        env.update(UNLIMITED)
+    os.environ.update(env)
+
+    # bench_questionnaire импортирует app, поэтому только после env
+    from bench_questionnaire import FIELD_MAPPING
+
+    with open(mapping_path, "w", encoding="utf-8") as f:
+        json.dump(FIELD_MAPPING, f, ensure_ascii=False)
+
+
+def make_questionnaire_file(number: int) -> bytes:
+    """
+    xlsx-анкета в формате шаблона: заголовок и столбцы поле/значение, у каждого пользователя своя,
+    чтобы запросы не отдавались из кэша результатов
+    """
+    from openpyxl import Workbook
+    from bench_questionnaire import make_questionnaire
+
+    workbook = Workbook()
+    sheet = workbook.active
+    questionnaire = make_questionnaire(number)
+    sheet.append(list(questionnaire.columns))
+    for row in questionnaire.itertuples(index=False):
+        sheet.append(list(row))
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+class ServerThread:
+    """
+    Отдельный поток со своим event loop для фейковых серверов,
+    чтобы их работа не попадала в задержки и лаг цикла бота
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="fake-servers", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def call(self, func, *args):
+        self.loop.call_soon_threadsafe(func, *args)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+class Inbox:
+    """
+    Ответы бота по чатам: вызовы фейкового Bot API перекладываются из потока серверов в цикл бота
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.chats = defaultdict(asyncio.Queue)
+
+    def on_call(self, method: str, params: dict):
+        # вызывается в потоке фейкового сервера
+        received = time.perf_counter()
+        self.loop.call_soon_threadsafe(self._put, method, params, received)
+
+    def _put(self, method: str, params: dict, received: float):
+        chat_id = params.get("chat_id")
+        if isinstance(chat_id, int):
+            self.chats[chat_id].put_nowait((received, method, params))
+
+    async def expect(self, chat_id: int, method: str, fragment: str = None) -> float:
+        """
+        Ждет ответ бота в чат, пропуская промежуточные ("Анкета в обработке" и т.п.)
+        """
+        queue = self.chats[chat_id]
+        while True:
+            received, called, params = await queue.get()
+            text = params.get("text") or params.get("caption") or ""
+            if called == method and (fragment is None or fragment in text):
+                return received
+
+
+class LoadTest:
+    def __init__(self, args, server: ServerThread, telegram, inbox: Inbox):
+        self.args = args
+        self.server = server
+        self.telegram = telegram
+        self.inbox = inbox
+        self.update_ids = itertools.count(1)
+        self.latencies = defaultdict(list)
+        self.failed = []
+        self.updates = 0
+
+    def send(self, user_id: int, text: str = None, document: dict = None) -> float:
+        from fake_telegram import make_message_update
+
+        update = make_message_update(next(self.update_ids), user_id, text, document)
+        self.updates += 1
+        sent = time.perf_counter()
+        self.server.call(self.telegram.push_update, update)
+        return sent
+
+    async def run_user(self, number: int):
+        user_id = USER_ID_BASE + number
+        document = self.telegram.add_file(make_questionnaire_file(number), "questionnaire.xlsx")
+        started = time.perf_counter()
+        try:
+            for step, text, method, fragment in STEPS:
+                if step == "name":
+                    text = f"Пользователь {number}"
+                if step == "pdf":
+                    # pdf меряется от загрузки анкеты: очередь задач + бэкенд + отправка
+                    sent = uploaded
+                elif step == "upload":
+                    sent = uploaded = self.send(user_id, document=document)
+                else:
+                    sent = self.send(user_id, text)
+                received = await asyncio.wait_for(self.inbox.expect(user_id, method, fragment),
+                                                  self.args.timeout)
+                self.latencies[step].append(received - sent)
+        except asyncio.TimeoutError:
+            self.failed.append((user_id, step))
+            return
+        self.latencies["flow"].append(time.perf_counter() - started)
+
+    async def run_users(self):
+        users = []
+        for number in range(self.args.users):
+            users.append(asyncio.create_task(self.run_user(number)))
+            if self.args.rate:
+                await asyncio.sleep(1 / self.args.rate)
+        await asyncio.gather(*users)
+
+
+async def monitor_loop_lag(samples: list, interval: float = 0.01):
+    """
+    Насколько позже запланированного просыпается корутина - задержка event loop бота
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def report(name: str, values: list):
+    if not values:
+        print(f"{name:<12} n=0")
+        return
+    p = lambda q: percentile(values, q) * 1000
+    print(f"{name:<12} n={len(values):<6} mean={statistics.mean(values) * 1000:8.1f} ms  "
+          f"p50={p(0.5):8.1f} ms  p95={p(0.95):8.1f} ms  p99={p(0.99):8.1f} ms  max={max(values) * 1000:8.1f} ms")
+
+
+async def run(args) -> int:
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    from fake_numerology import FakeNumerologyBackend
+    from fake_telegram import FakeTelegramServer
+
+    server = ServerThread()
+    server.start()
+    telegram = FakeTelegramServer(delay=args.rtt / 2)
+    backend = FakeNumerologyBackend(latency=args.backend_latency, pdf_size=args.pdf_size)
+    server.run(telegram.start())
+    server.run(backend.start())
+    inbox = Inbox(asyncio.get_running_loop())
+    telegram.on_call = inbox.on_call
+    # адрес заглушки известен только после старта, воркеры шардов читают его из env
+    os.environ["BACKEND_URL"] = backend.url
+
+    from app.main import bot_runtime
+    from app.sharding import WorkerPool, create_front_dispatcher
+
+    # app.main включает INFO-лог в консоль, под нагрузкой он сам становится узким местом
+    logging.getLogger().setLevel(logging.WARNING)
+    bot = Bot(token=TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(telegram.url)))
+    test = LoadTest(args, server, telegram, inbox)
+    lag = []
+    monitor = asyncio.create_task(monitor_loop_lag(lag))
+    try:
+        async with AsyncExitStack() as stack:
+            if args.shards > 1:
+                # тот же фронт, что в run_front, но с остановкой polling из бенчмарка
+                pool = WorkerPool(args.shards, bot.token, bot.session.api)
+                dp = create_front_dispatcher(pool)
+                await pool.start()
+                stack.push_async_callback(pool.stop)
+                polling_options = {"handle_as_tasks": False}
+            else:
+                dp = await stack.enter_async_context(bot_runtime(bot, metrics_port=0))
+                polling_options = {}
+            polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False,
+                                                           **polling_options))
+            stack.push_async_callback(asyncio.wait, [polling])
+            stack.push_async_callback(dp.stop_polling)
+            # воркеры шардов стартуют с нуля в новых процессах: импорт aiogram, pandas и т.д.
+            await asyncio.sleep(args.warmup if args.shards > 1 else 0.5)
+            started = time.perf_counter()
+            await test.run_users()
+            elapsed = time.perf_counter() - started
+    finally:
+        monitor.cancel()
+        await bot.session.close()
+        server.run(telegram.stop())
+        server.run(backend.stop())
+        server.stop()
+
+    completed = len(test.latencies["flow"])
+    print(f"users={args.users} completed={completed} failed={len(test.failed)} "
+          f"elapsed={elapsed:.2f} s  backend requests={len(backend.requests)}")
+    print(f"throughput   {completed / elapsed:8.1f} flows/s  {test.updates / elapsed:8.1f} updates/s")
+    for step, *_ in STEPS:
+        report(step, test.latencies[step])
+    report("flow", test.latencies["flow"])
+    report("loop lag" if args.shards <= 1 else "front lag", lag)
+
+    failed = bool(test.failed)
+    for user_id, step in test.failed[:10]:
+        print(f"FAIL: пользователь {user_id} не получил ответ на шаге {step}")
+    flow = test.latencies["flow"]
+    if args.max_p95_ms and flow and percentile(flow, 0.95) * 1000 > args.max_p95_ms:
+        print(f"FAIL: p95 сценария {percentile(flow, 0.95) * 1000:.1f} ms > порога {args.max_p95_ms:.1f} ms")
+        failed = True
+    if args.max_lag_ms and lag and max(lag) * 1000 > args.max_lag_ms:
+        print(f"FAIL: лаг event loop {max(lag) * 1000:.1f} ms > порога {args.max_lag_ms:.1f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=50, help="новых пользователей в секунду, 0 - все сразу")
+    parser.add_argument("--rtt", type=float, default=0.0, help="имитация сетевой задержки до Telegram, сек")
+    parser.add_argument("--backend-latency", type=float, default=0.1, help="время расчета одной анкеты, сек")
+    parser.add_argument("--pdf-size", type=int, default=64 * 1024)
+    parser.add_argument("--workers", type=int, default=4, help="воркеров очереди нумерологии")
+    parser.add_argument("--shards", type=int, default=1, help="процессов-воркеров бота (BOT_WORKERS)")
+    parser.add_argument("--warmup", type=float, default=10, help="ожидание старта воркеров шардов, сек")
+    parser.add_argument("--timeout", type=float, default=120, help="ожидание одного ответа бота, сек")
+    parser.add_argument("--real-limits", action="store_true", help="не снимать лимиты отправки и троттлинга")
+    parser.add_argument("--max-p95-ms", type=float, default=0, help="порог p95 всего сценария")
+    parser.add_argument("--max-lag-ms", type=float, default=0, help="порог максимального лага event loop")
+    parser.add_argument("--keep", action="store_true", help="не удалять временный каталог")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bot-load-")
+    configure_env(work_dir, args)
+    try:
+        code = asyncio.run(run(args))
+    finally:
+        if args.keep:
+            print(f"данные прогона: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
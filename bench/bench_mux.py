@@ -0,0 +1,73 @@
+"""
+Бенчмарк сборки видео с новым голосом (rnd/auido_clone.py::replace_audio_with_voice_on_segments):
+копирование видеопотока с отдельно закодированным звуком (output_mode="copy")
+против полного перекодирования через moviepy (output_mode="reencode").
+Голос синтезируется офлайн-заглушкой, тестовое видео генерирует ffmpeg (нужен moviepy и его ffmpeg).
+
+python bench/bench_mux.py --seconds 30 120 --resolution 1280x720
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR / "rnd"))
+
+from moviepy.config import get_setting
+from moviepy.editor import VideoFileClip
+
+import auido_clone
+from tts_cache import StubEngine, TTSCache, synthesize
+
+TEXT = "Дорогие гости, поднимем бокалы за молодых! Сегодня особенный день. Горько!"
+
+
+def make_video(path: str, seconds: float, resolution: str):
+    # тестовая картинка с движением и звуком - как обычный ролик с телефона
+    subprocess.run([
+        get_setting("FFMPEG_BINARY"), "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={resolution}:rate=30:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-c:a", "aac", path,
+    ], check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, nargs="+", default=[30, 120])
+    parser.add_argument("--resolution", default="1280x720")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        cache = TTSCache(os.path.join(work_dir, "tts_cache"))
+
+        def stub_voice(text, output_path, speed_factor=1.5):
+            synthesize(text, engine=StubEngine(), cache=cache).export(output_path, format="wav")
+            return output_path
+
+        # сеть для gTTS не нужна: голос - детерминированная заглушка
+        auido_clone.generate_continuous_funny_voice = stub_voice
+
+        print(f"{'секунд':>7} {'reencode':>12} {'copy':>10} {'ускорение':>10}")
+        for seconds in args.seconds:
+            video_path = os.path.join(work_dir, f"clip_{seconds:g}.mp4")
+            make_video(video_path, seconds, args.resolution)
+            timings = {}
+            for mode in ("reencode", "copy"):
+                start = time.perf_counter()
+                output_path = auido_clone.replace_audio_with_voice_on_segments(video_path, TEXT, output_mode=mode)
+                timings[mode] = time.perf_counter() - start
+                assert output_path, f"сборка в режиме {mode} не удалась"
+                with VideoFileClip(output_path) as clip:
+                    assert clip.audio is not None, "в результате нет звука"
+                    assert abs(clip.duration - seconds) < 0.1, f"длительность {clip.duration:.2f} вместо {seconds:g}"
+            speedup = f"x{timings['reencode'] / timings['copy']:.0f}"
+            print(f"{seconds:7g} {timings['reencode'] * 1000:9.0f} ms {timings['copy'] * 1000:7.0f} ms {speedup:>10}")
+
+
+if __name__ == "__main__":
+    main()
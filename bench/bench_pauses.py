@@ -0,0 +1,91 @@
+"""
+Бенчмарк сжатия пауз в голосе (rnd/audio_tools.py::compact_pauses)
+против прежней склейки через += на синтетической "речи" разной длины.
+
+python bench/bench_pauses.py --minutes 1 2 5 10
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from pydub import AudioSegment
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR / "rnd"))
+
+from audio_tools import compact_pauses
+
+FRAME_RATE = 24000  # как у mp3 от gTTS
+
+
+def make_speech(minutes: float, seed: int = 0, noise: int = 0) -> tuple:
+    """
+    Чередование "слов" (шум 150-900 мс) и пауз (150-600 мс), моно 16 бит.
+    noise - амплитуда фонового шума в паузах.
+    Возвращает AudioSegment и участки тишины в мс
+    """
+    rng = np.random.default_rng(seed)
+    total_ms = int(minutes * 60_000)
+    chunks, silence_parts = [], []
+    position = 0
+    while position < total_ms:
+        word = int(rng.integers(150, 900))
+        chunks.append(rng.integers(-12000, 12000, word * FRAME_RATE // 1000, dtype=np.int16))
+        position += word
+        pause = int(rng.integers(150, 600))
+        chunks.append(rng.integers(-noise, noise + 1, pause * FRAME_RATE // 1000, dtype=np.int16))
+        silence_parts.append([position, position + pause])
+        position += pause
+    samples = np.concatenate(chunks)
+    audio = AudioSegment(samples.tobytes(), frame_rate=FRAME_RATE, sample_width=2, channels=1)
+    return audio, silence_parts
+
+
+def legacy_compact_pauses(audio: AudioSegment, silence_parts: list) -> AudioSegment:
+    """
+    Прежняя реализация из generate_continuous_funny_voice. Пауза создается сразу в частоте
+    трека: silent() по умолчанию 11025 Гц, и при склейке pydub пересэмплирует ее в 9.9 мс
+    """
+    continuous_audio = AudioSegment.empty()
+    last_end = 0
+    for start, end in silence_parts:
+        if start > last_end:
+            continuous_audio += audio[last_end:start]
+        continuous_audio += AudioSegment.silent(duration=10, frame_rate=audio.frame_rate)
+        last_end = end
+    if last_end < len(audio):
+        continuous_audio += audio[last_end:]
+    return continuous_audio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 2, 5, 10])
+    parser.add_argument("--legacy-max-minutes", type=float, default=10,
+                        help="прежнюю реализацию гонять только на треках не длиннее, она квадратичная")
+    args = parser.parse_args()
+
+    print(f"{'минут':>6} {'пауз':>6} {'+=':>12} {'compact_pauses':>16} {'ускорение':>10}")
+    for minutes in args.minutes:
+        audio, silence_parts = make_speech(minutes)
+
+        start = time.perf_counter()
+        result = compact_pauses(audio, silence_parts)
+        fast_time = time.perf_counter() - start
+
+        legacy = "-"
+        speedup = ""
+        if minutes <= args.legacy_max_minutes:
+            start = time.perf_counter()
+            expected = legacy_compact_pauses(audio, silence_parts)
+            legacy_time = time.perf_counter() - start
+            assert expected.raw_data == result.raw_data, "результат не совпадает с прежней склейкой"
+            legacy = f"{legacy_time * 1000:9.1f} ms"
+            speedup = f"x{legacy_time / fast_time:.0f}"
+        print(f"{minutes:6g} {len(silence_parts):6d} {legacy:>12} {fast_time * 1000:13.1f} ms {speedup:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Бенчмарк перевода анкет нумерологии в json для бэкенда.
+Сравнивает построчный iterrows (как было) с fill_mapping_many.
+
+python bench/bench_questionnaire.py --count 5000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from app.services.questionnaire import fill_mapping_many, load_field_mapping
+
+FIELD_MAPPING = {
+    "Имя": ["base", "name"],
+    "Фамилия": ["base", "surname"],
+    "Дата рождения": ["base", "birth_date"],
+    "Дата консультирования": ["base_optional", "consultation_date"],
+    "Город": ["base_optional", "city"],
+    "Запрос": ["desire", "None"],
+    "Подробности запроса": ["desire_optional", "details"],
+    "Хобби": ["optional", "hobby"],
+    "Любимое число": ["optional", "number"],
+}
+
+
+def legacy_fill_mapping(user_info: pd.DataFrame, field_mapping: dict) -> dict:
+    """
+    Прежняя реализация: построчный обход iterrows
+    """
+    json_data = {"base": {}, "base_optional": {}, "desire": "", "desire_optional": {}, "optional": {}}
+    for i, row in user_info.iterrows():
+        if len(row) < 2:
+            continue
+        field_name = row.iloc[0]
+        field_value = row.iloc[1]
+        if field_name in field_mapping:
+            section, key = field_mapping[field_name]
+            if field_name == "Дата рождения" or field_name == "Дата консультирования":
+                try:
+                    if isinstance(field_value, str) and '.' in field_value:
+                        day, month, year = field_value.split('.')
+                        field_value = f"{year}-{month}-{day}"
+                    elif isinstance(field_value, datetime):
+                        field_value = field_value.strftime("%Y-%m-%d")
+                except Exception:
+                    pass
+            if key == "None":
+                json_data[section] = field_value
+            else:
+                json_data[section][key] = field_value
+    return json_data
+
+
+def make_questionnaire(number: int) -> pd.DataFrame:
+    rows = [
+        ("Имя", f"Имя {number}"),
+        ("Фамилия", f"Фамилия {number}"),
+        ("Дата рождения", f"{number % 28 + 1:02d}.{number % 12 + 1:02d}.19{number % 100:02d}"),
+        ("Дата консультирования", datetime(2025, 4, number % 28 + 1)),
+        ("Город", "Москва"),
+        ("Запрос", "Найти пару"),
+        ("Подробности запроса", "Очень нужно"),
+        ("Хобби", "Нумерология"),
+        ("Любимое число", number % 10),
+        ("Комментарий", "не входит в маппинг"),
+    ]
+    return pd.DataFrame(rows, columns=["Поле", "Значение"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=5000, help="число анкет")
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as f:
+        json.dump(FIELD_MAPPING, f, ensure_ascii=False)
+    try:
+        mapping = load_field_mapping(f.name)
+        questionnaires = [make_questionnaire(i) for i in range(args.count)]
+
+        start = time.perf_counter()
+        expected = [legacy_fill_mapping(q, FIELD_MAPPING) for q in questionnaires]
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = fill_mapping_many(questionnaires, mapping)
+        batch_time = time.perf_counter() - start
+    finally:
+        os.unlink(f.name)
+
+    assert result == expected, "результаты не совпадают с построчной реализацией"
+    print(f"анкет: {args.count}")
+    print(f"iterrows:          {legacy_time * 1000:9.1f} ms")
+    print(f"fill_mapping_many: {batch_time * 1000:9.1f} ms  (x{legacy_time / batch_time:.1f})")
+
+
+if __name__ == "__main__":
+    main()
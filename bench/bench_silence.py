@@ -0,0 +1,56 @@
+"""
+Бенчмарк поиска тишины: pydub.silence.detect_silence (окно за окном через audioop)
+против векторного rnd/audio_tools.py::detect_silence, с проверкой совпадения интервалов.
+
+python bench/bench_silence.py --minutes 0.5 1 5 10 --pydub-max-minutes 1
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from pydub.silence import detect_silence as pydub_detect_silence
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR / "rnd"))
+sys.path.append(str(ROOT_DIR / "bench"))
+
+from audio_tools import detect_silence
+from bench_pauses import make_speech
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[0.5, 1, 5, 10])
+    parser.add_argument("--min-silence-len", type=int, default=150)
+    parser.add_argument("--silence-thresh", type=float, default=-40)
+    parser.add_argument("--seek-step", type=int, default=1)
+    parser.add_argument("--pydub-max-minutes", type=float, default=1,
+                        help="pydub гонять только на треках не длиннее, он медленный")
+    args = parser.parse_args()
+    options = dict(min_silence_len=args.min_silence_len, silence_thresh=args.silence_thresh,
+                   seek_step=args.seek_step)
+
+    print(f"{'минут':>6} {'участков':>9} {'pydub':>12} {'numpy':>12} {'ускорение':>10}")
+    for minutes in args.minutes:
+        # шум в паузах около -56 dBFS, чтобы порог действительно работал
+        audio, _ = make_speech(minutes, noise=50)
+
+        start = time.perf_counter()
+        result = detect_silence(audio, **options)
+        fast_time = time.perf_counter() - start
+
+        reference = "-"
+        speedup = ""
+        if minutes <= args.pydub_max_minutes:
+            start = time.perf_counter()
+            expected = pydub_detect_silence(audio, **options)
+            pydub_time = time.perf_counter() - start
+            assert expected == result, "интервалы не совпадают с pydub"
+            reference = f"{pydub_time * 1000:9.1f} ms"
+            speedup = f"x{pydub_time / fast_time:.0f}"
+        print(f"{minutes:6g} {len(result):9d} {reference:>12} {fast_time * 1000:9.1f} ms {speedup:>10}")
+
+
+if __name__ == "__main__":
+    main()
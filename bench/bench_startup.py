@@ -0,0 +1,101 @@
+"""
+Время холодного старта бота: импорт app.main и стартовые вызовы Bot API
+(get_me, set_my_commands, delete_webhook) последовательно и параллельно.
+Импорт меряется в отдельном процессе, чтобы кэш модулей не искажал результат.
+
+python bench/bench_startup.py --runs 5 --rtt 0.05 --max-import-ms 1500
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+sys.path.append(str(ROOT_DIR / "bench"))
+
+from app.main import set_commands
+from fake_telegram import FakeTelegramServer
+
+TOKEN = "42:FAKE"
+
+# тяжелые модули, которые не должны грузиться при старте бота
+LAZY_MODULES = ("pandas", "numpy", "openpyxl")
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def measure_import() -> dict:
+    env = dict(os.environ, PYTHONPATH=str(ROOT_DIR), BOT_TOKEN=os.getenv("BOT_TOKEN", TOKEN))
+    output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=ROOT_DIR, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+async def measure_calls(rtt: float, concurrent: bool) -> float:
+    server = FakeTelegramServer(delay=rtt / 2)
+    await server.start()
+    bot = Bot(token=TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(server.url)))
+    try:
+        calls = [bot.get_me, lambda: set_commands(bot),
+                 lambda: bot.delete_webhook(drop_pending_updates=True)]
+        started = time.perf_counter()
+        if concurrent:
+            await asyncio.gather(*(call() for call in calls))
+        else:
+            for call in calls:
+                await call()
+        return time.perf_counter() - started
+    finally:
+        await bot.session.close()
+        await server.stop()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rtt", type=float, default=0.05, help="имитация сетевой задержки до Telegram, сек")
+    parser.add_argument("--max-import-ms", type=float, default=0,
+                        help="порог времени импорта, при превышении - ненулевой код выхода")
+    args = parser.parse_args()
+    logging.getLogger("aiohttp.access").setLevel(logging.WARNING)
+
+    probes = [measure_import() for _ in range(args.runs)]
+    import_ms = statistics.median(probe["seconds"] for probe in probes) * 1000
+    loaded = sorted({module for probe in probes for module in probe["loaded"]})
+    print(f"import app.main        median={import_ms:8.1f} ms  runs={args.runs}")
+    print(f"lazy modules loaded    {', '.join(loaded) or 'none'}")
+
+    sequential = statistics.median([await measure_calls(args.rtt, False) for _ in range(args.runs)])
+    concurrent = statistics.median([await measure_calls(args.rtt, True) for _ in range(args.runs)])
+    print(f"startup calls seq      median={sequential * 1000:8.1f} ms")
+    print(f"startup calls gather   median={concurrent * 1000:8.1f} ms")
+
+    failed = False
+    if loaded:
+        print(f"FAIL: при старте загружены {', '.join(loaded)}")
+        failed = True
+    if args.max_import_ms and import_ms > args.max_import_ms:
+        print(f"FAIL: импорт {import_ms:.1f} ms > порога {args.max_import_ms:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+"""
+Бенчмарк синтеза речи по предложениям (rnd/tts_cache.py::synthesize): последовательно
+против пула воркеров на офлайн-движке-заглушке с задержкой ответа, как у сетевого TTS.
+Каждый прогон - с пустым кэшем, чтобы мерить именно синтез.
+
+python bench/bench_tts.py --sentences 40 --latency 0.3 --workers 1 4 8 16
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR / "rnd"))
+
+from tts_cache import StubEngine, TTSCache, synthesize
+
+PHRASES = [
+    "Дорогие гости, поднимем бокалы за молодых!",
+    "Сегодня особенный день для двух любящих сердец.",
+    "А теперь конкурс для самых смелых.",
+    "Кто громче всех крикнет, получит приз.",
+    "Горько!",
+]
+
+
+def make_monologue(sentences: int) -> str:
+    # номер в каждой фразе - все предложения разные, повторов внутри текста нет
+    return " ".join(f"{PHRASES[i % len(PHRASES)][:-1]}, номер {i}{PHRASES[i % len(PHRASES)][-1]}"
+                    for i in range(sentences))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sentences", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.3, help="время синтеза одного предложения, с")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    text = make_monologue(args.sentences)
+    engine = StubEngine(latency=args.latency)
+    print(f"{'воркеров':>8} {'время':>10} {'ускорение':>10}")
+    baseline = None
+    expected = None
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            start = time.perf_counter()
+            audio = synthesize(text, engine=engine, cache=TTSCache(cache_dir), workers=workers, gap_ms=200)
+            elapsed = time.perf_counter() - start
+        # порядок предложений не зависит от числа воркеров
+        if expected is None:
+            expected = audio.raw_data
+        assert audio.raw_data == expected, "результат зависит от числа воркеров"
+        baseline = baseline or elapsed
+        print(f"{workers:8d} {elapsed * 1000:7.0f} ms {f'x{baseline / elapsed:.1f}':>10}")
+
+
+if __name__ == "__main__":
+    main()
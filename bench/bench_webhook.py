@@ -0,0 +1,141 @@
+"""
+Задержка от отправки апдейта до входа в хендлер: long polling против вебхука.
+Telegram подменяется локальным фейковым Bot API (bench/fake_telegram.py).
+
+python bench/bench_webhook.py --updates 2000 --rtt 0.02
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+from aiohttp import web
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+sys.path.append(str(ROOT_DIR / "bench"))
+
+from app.webhook import create_webhook_app
+from fake_telegram import FakeTelegramServer, make_message_update, send_webhook_update
+
+TOKEN = "42:FAKE"
+SECRET = "bench-secret"
+
+
+class Recorder:
+    def __init__(self, expected: int):
+        self.sent = {}
+        self.latencies = []
+        self.expected = expected
+        self.done = asyncio.Event()
+
+    def router(self) -> Router:
+        router = Router()
+
+        @router.message()
+        async def on_message(message: Message):
+            self.latencies.append(time.perf_counter() - self.sent[message.message_id])
+            if len(self.latencies) >= self.expected:
+                self.done.set()
+
+        return router
+
+
+def make_bot(server: FakeTelegramServer) -> Bot:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(server.url))
+    return Bot(token=TOKEN, session=session)
+
+
+async def bench_polling(updates: int, users: int, rtt: float, rate: float) -> list:
+    server = FakeTelegramServer(delay=rtt / 2)
+    await server.start()
+    bot = make_bot(server)
+    recorder = Recorder(updates)
+    dp = Dispatcher()
+    dp.include_router(recorder.router())
+    polling = asyncio.create_task(dp.start_polling(bot, polling_timeout=10, handle_signals=False))
+    try:
+        await asyncio.sleep(0.2)
+        for i in range(1, updates + 1):
+            recorder.sent[i] = time.perf_counter()
+            server.push_update(make_message_update(i, i % users + 1, "hi"))
+            if rate:
+                await asyncio.sleep(1 / rate)
+        await asyncio.wait_for(recorder.done.wait(), 60)
+    finally:
+        await dp.stop_polling()
+        await polling
+        await bot.session.close()
+        await server.stop()
+    return recorder.latencies
+
+
+async def bench_webhook(updates: int, users: int, rtt: float, rate: float) -> tuple:
+    server = FakeTelegramServer(delay=rtt / 2)
+    await server.start()
+    bot = make_bot(server)
+    recorder = Recorder(updates)
+    dp = Dispatcher()
+    dp.include_router(recorder.router())
+    app = create_webhook_app(bot, dp, path="/webhook", secret_token=SECRET)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/webhook"
+    acks = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            assert await send_webhook_update(session, url, make_message_update(0, 1, "x"), "wrong") == 401
+            sends = []
+            for i in range(1, updates + 1):
+                recorder.sent[i] = time.perf_counter()
+
+                async def send(update=make_message_update(i, i % users + 1, "hi"), started=recorder.sent[i]):
+                    if rtt:
+                        await asyncio.sleep(rtt / 2)
+                    await send_webhook_update(session, url, update, SECRET)
+                    acks.append(time.perf_counter() - started)
+
+                sends.append(asyncio.create_task(send()))
+                if rate:
+                    await asyncio.sleep(1 / rate)
+            await asyncio.gather(*sends)
+            await asyncio.wait_for(recorder.done.wait(), 60)
+    finally:
+        await runner.cleanup()
+        await server.stop()
+    return recorder.latencies, acks
+
+
+def report(name: str, values: list):
+    values = sorted(values)
+    p = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000
+    print(f"{name:<22} n={len(values):<6} mean={statistics.mean(values) * 1000:8.2f} ms  "
+          f"p50={p(0.5):8.2f} ms  p95={p(0.95):8.2f} ms  p99={p(0.99):8.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rtt", type=float, default=0.0, help="имитация сетевой задержки до Telegram, сек")
+    parser.add_argument("--rate", type=float, default=500, help="апдейтов в секунду, 0 - без паузы")
+    args = parser.parse_args()
+
+    report("polling", await bench_polling(args.updates, args.users, args.rtt, args.rate))
+    latencies, acks = await bench_webhook(args.updates, args.users, args.rtt, args.rate)
+    report("webhook", latencies)
+    report("webhook ack (200)", acks)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,52 @@
+"""
+Заглушка бэкенда нумерологии для бенчмарков: на POST /numerology/user/
+после заданной задержки отдает pdf сырыми байтами и ссылку в X-Result-Link
+"""
+import asyncio
+import itertools
+
+from aiohttp import web
+
+FAKE_PDF_HEADER = b"%PDF-1.4\n"
+
+
+class FakeNumerologyBackend:
+    """
+    latency - время "расчета" одной анкеты, pdf_size - размер отдаваемого pdf.
+    Тела запросов записываются в requests
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, pdf_size: int = 64 * 1024):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.pdf = FAKE_PDF_HEADER + b"0" * max(0, pdf_size - len(FAKE_PDF_HEADER))
+        self.requests = []
+        self._ids = itertools.count(1)
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/numerology/user/", self._handle_user)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_user(self, request: web.Request) -> web.Response:
+        self.requests.append(await request.json())
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        link = f"https://docs.google.com/spreadsheets/d/fake{next(self._ids)}"
+        return web.Response(body=self.pdf, content_type="application/pdf",
+                            headers={"X-Result-Link": link})
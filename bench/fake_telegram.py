@@ -0,0 +1,172 @@
+"""
+Локальный фейковый Telegram Bot API для бенчмарков: отвечает на методы бота,
+отдает апдейты через getUpdates (long polling), файлы через /file/ и умеет
+слать апдейты в вебхук бота
+"""
+import asyncio
+import itertools
+import json
+import time
+
+import aiohttp
+from aiohttp import web
+
+FAKE_BOT_ID = 1000
+
+
+def make_user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+
+def make_message_update(update_id: int, user_id: int, text: str = None, document: dict = None) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": make_user(user_id),
+    }
+    if text is not None:
+        message["text"] = text
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    if document is not None:
+        message["document"] = document
+    return {"update_id": update_id, "message": message}
+
+
+class FakeTelegramServer:
+    """
+    Фейковый Bot API. Все вызовы методов записываются в calls как (время, метод, параметры),
+    on_call вызывается на каждый вызов - по нему бенчмарки меряют задержку ответа бота.
+    delay - имитация сетевой задержки в одну сторону
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.calls = []
+        self.files = {}
+        self.on_call = None
+        self._updates = None
+        self._ids = itertools.count(1)
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._updates = asyncio.Queue()
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self._handle_method)
+        app.router.add_get("/file/bot{token}/{path:.+}", self._handle_file)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def push_update(self, update: dict):
+        self._updates.put_nowait(update)
+
+    def add_file(self, data: bytes, file_name: str = "file.bin") -> dict:
+        """
+        Регистрирует файл для скачивания ботом, возвращает объект Document
+        """
+        file_id = f"file{next(self._ids)}"
+        self.files[file_id] = data
+        return {"file_id": file_id, "file_unique_id": file_id, "file_name": file_name, "file_size": len(data)}
+
+    @staticmethod
+    async def _read_params(request: web.Request) -> dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        params = {}
+        form = await request.post()
+        for key, value in form.items():
+            if isinstance(value, web.FileField):
+                params[key] = value.file.read()
+                continue
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+        return params
+
+    async def _handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await self._read_params(request)
+        if method.lower() == "getupdates":
+            result = await self._get_updates(params)
+        else:
+            if self.delay:
+                await asyncio.sleep(2 * self.delay)
+            result = self._result(method, params)
+            self.calls.append((time.perf_counter(), method, params))
+            if self.on_call is not None:
+                self.on_call(method, params)
+        return web.json_response({"ok": True, "result": result})
+
+    async def _handle_file(self, request: web.Request) -> web.Response:
+        data = self.files.get(request.match_info["path"])
+        if data is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=data)
+
+    async def _get_updates(self, params: dict) -> list:
+        timeout = float(params.get("timeout") or 0)
+        updates = []
+        # запрос идет до Telegram, ответ с апдейтами - обратно
+        await asyncio.sleep(self.delay)
+        try:
+            updates.append(await asyncio.wait_for(self._updates.get(), timeout))
+        except asyncio.TimeoutError:
+            return []
+        while not self._updates.empty() and len(updates) < 100:
+            updates.append(self._updates.get_nowait())
+        await asyncio.sleep(self.delay)
+        return updates
+
+    def _message(self, params: dict, **extra) -> dict:
+        chat_id = params.get("chat_id", 0)
+        message = {
+            "message_id": next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": FAKE_BOT_ID, "is_bot": True, "first_name": "Fake"},
+        }
+        message.update(extra)
+        return message
+
+    def _result(self, method: str, params: dict):
+        method = method.lower()
+        if method == "getme":
+            return {"id": FAKE_BOT_ID, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        if method in ("sendmessage", "editmessagetext"):
+            return self._message(params, text=params.get("text", ""))
+        if method == "senddocument":
+            document = self.add_file(b"", "document")
+            return self._message(params, document=document, caption=params.get("caption"))
+        if method == "getfile":
+            file_id = params["file_id"]
+            return {"file_id": file_id, "file_unique_id": file_id,
+                    "file_size": len(self.files.get(file_id, b"")), "file_path": file_id}
+        return True
+
+
+async def send_webhook_update(session: aiohttp.ClientSession, url: str, update: dict,
+                              secret_token: str = None) -> int:
+    """
+    Шлет апдейт в вебхук бота так же, как это делает Telegram
+    """
+    headers = {}
+    if secret_token:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = secret_token
+    async with session.post(url, json=update, headers=headers) as response:
+        await response.read()
+        return response.status
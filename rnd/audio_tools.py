@@ -0,0 +1,217 @@
+"""
+Быстрые операции над AudioSegment для голосового пайплайна: работают с сырыми
+сэмплами через numpy вместо поэлементных операций pydub
+"""
+import os
+import subprocess
+
+import numpy as np
+from pydub import AudioSegment
+
+# ffmpeg для склейки дорожек; та же переменная, что читает moviepy
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+
+def compact_pauses(audio, silence_parts, pause_ms=10):
+    """
+    Заменяет участки тишины короткими паузами за один проход по сырым сэмплам:
+    считает интервалы, которые остаются, и склеивает их одной конкатенацией
+    (+= у AudioSegment каждый раз копирует весь накопленный трек - O(n²) на длинных текстах)
+    
+    Args:
+        audio: исходный AudioSegment
+        silence_parts: участки тишины [[start, end], ...] в мс, как возвращает detect_silence
+        pause_ms: длительность паузы вместо каждого участка тишины
+    
+    Returns:
+        Новый AudioSegment
+    """
+    if not silence_parts:
+        return audio
+    
+    duration = len(audio)
+    bounds = np.clip(np.asarray(silence_parts, dtype=np.int64).reshape(-1, 2), 0, duration)
+    keep_starts = np.concatenate(([0], bounds[:, 1]))
+    keep_ends = np.concatenate((bounds[:, 0], [duration]))
+    keep = keep_ends > keep_starts
+    
+    # мс -> номер кадра так же, как при срезе audio[start:end]
+    def to_frames(ms):
+        return (ms * audio.frame_rate / 1000).astype(np.int64)
+    
+    frame_starts, frame_ends = to_frames(keep_starts), to_frames(keep_ends)
+    frames = np.frombuffer(audio.raw_data, dtype=np.uint8).reshape(-1, audio.frame_width)
+    missing = int(frame_ends.max()) - len(frames)
+    if missing > 0:
+        # срез по len(audio) может быть на пару кадров длиннее данных - добиваем тишиной, как pydub
+        frames = np.concatenate((frames, np.zeros((missing, audio.frame_width), dtype=np.uint8)))
+    pause = np.zeros((int(pause_ms * audio.frame_rate / 1000), audio.frame_width), dtype=np.uint8)
+    
+    # срезы numpy - это view, данные копируются один раз в np.concatenate
+    pieces = []
+    for i in range(len(bounds)):
+        if keep[i]:
+            pieces.append(frames[frame_starts[i]:frame_ends[i]])
+        pieces.append(pause)
+    if keep[-1]:
+        pieces.append(frames[frame_starts[-1]:frame_ends[-1]])
+    return audio._spawn(np.concatenate(pieces).tobytes())
+
+
+# сколько сэмплов возводить в квадрат за раз - ограничивает память на длинных треках
+ENERGY_CHUNK_SAMPLES = 1 << 22
+SAMPLE_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+
+
+def _energy_prefix(samples, positions):
+    """
+    Сумма квадратов samples[:p] для каждой позиции p (позиции не убывают).
+    Квадраты считаются кусками, в памяти не бывает больше ENERGY_CHUNK_SAMPLES кумулятивных сумм
+    """
+    # int64 точен для 8/16 бит; для 32 бит - float64, как в audioop.rms
+    accumulator = np.int64 if samples.dtype.itemsize <= 2 else np.float64
+    prefix = np.zeros(len(positions), dtype=accumulator)
+    running = accumulator(0)
+    done = 0
+    for start in range(0, len(samples), ENERGY_CHUNK_SAMPLES):
+        chunk = samples[start:start + ENERGY_CHUNK_SAMPLES].astype(accumulator)
+        cumulative = np.cumsum(chunk * chunk) + running
+        end = start + len(chunk)
+        upto = np.searchsorted(positions, end, side="right")
+        chunk_positions = positions[done:upto]
+        prefix[done:upto] = np.where(chunk_positions > start,
+                                     cumulative[np.maximum(chunk_positions - start - 1, 0)],
+                                     running)
+        done = upto
+        running = cumulative[-1]
+    prefix[done:] = running
+    return prefix
+
+
+def detect_silence(audio, min_silence_len=1000, silence_thresh=-16, seek_step=1):
+    """
+    То же, что pydub.silence.detect_silence, но RMS всех окон считается разом
+    по кумулятивной сумме квадратов сэмплов, а не срезом и audioop.rms на каждое окно
+    
+    Args:
+        audio: AudioSegment
+        min_silence_len: длина окна и минимальная длина тишины, мс
+        silence_thresh: порог тишины, dBFS
+        seek_step: шаг окна (hop), мс - больше шаг, грубее границы и быстрее
+    
+    Returns:
+        Участки тишины [[start, end], ...] в мс
+    """
+    seg_len = len(audio)
+    if seg_len < min_silence_len:
+        return []
+    dtype = SAMPLE_DTYPES.get(audio.sample_width)
+    if dtype is None:
+        from pydub.silence import detect_silence as pydub_detect_silence
+        return pydub_detect_silence(audio, min_silence_len, silence_thresh, seek_step)
+    
+    threshold = 10 ** (silence_thresh / 20) * audio.max_possible_amplitude
+    samples = np.frombuffer(audio.raw_data, dtype=dtype)
+    
+    # границы миллисекунд в кадрах - как при срезе audio[start:end]; хвост за концом данных
+    # pydub добивает тишиной, поэтому энергия там не растет, а число сэмплов растет
+    boundaries = np.arange(seg_len + 1, dtype=np.int64) * audio.frame_rate // 1000
+    prefix = _energy_prefix(samples, np.minimum(boundaries * audio.channels, len(samples)))
+    
+    last_slice_start = seg_len - min_silence_len
+    starts = np.arange(0, last_slice_start + 1, seek_step, dtype=np.int64)
+    if last_slice_start % seek_step:
+        starts = np.append(starts, last_slice_start)
+    ends = starts + min_silence_len
+    energy = prefix[ends] - prefix[starts]
+    counts = (boundaries[ends] - boundaries[starts]) * audio.channels
+    mean_square = np.divide(energy, counts, out=np.zeros(len(starts)), where=counts > 0)
+    # audioop.rms отбрасывает дробную часть
+    rms = np.floor(np.sqrt(mean_square))
+    silence_starts = starts[rms <= threshold]
+    if not len(silence_starts):
+        return []
+    
+    # соседние окна сливаются в один участок, как в pydub: разрыв - только если окна
+    # не идут подряд и между ними есть щель длиннее окна
+    steps = np.diff(silence_starts)
+    breaks = np.flatnonzero((steps != seek_step) & (steps > min_silence_len)) + 1
+    range_starts = silence_starts[np.concatenate(([0], breaks))]
+    range_ends = silence_starts[np.concatenate((breaks - 1, [len(silence_starts) - 1]))] + min_silence_len
+    return [[int(start), int(end)] for start, end in zip(range_starts, range_ends)]
+
+
+def join_segments(segments, gap_ms=0):
+    """
+    Склеивает сегменты по порядку одной конкатенацией сырых данных с паузой gap_ms между ними.
+    Формат приводится к самому "старшему" среди сегментов - как при + в pydub
+    
+    Args:
+        segments: список AudioSegment
+        gap_ms: пауза между соседними сегментами, мс
+    
+    Returns:
+        Новый AudioSegment
+    """
+    if not segments:
+        return AudioSegment.empty()
+    frame_rate = max(segment.frame_rate for segment in segments)
+    channels = max(segment.channels for segment in segments)
+    sample_width = max(segment.sample_width for segment in segments)
+    segments = [segment.set_frame_rate(frame_rate).set_channels(channels).set_sample_width(sample_width)
+                for segment in segments]
+    gap = b"\0" * (int(gap_ms * frame_rate / 1000) * channels * sample_width)
+    return segments[0]._spawn(gap.join(segment.raw_data for segment in segments))
+
+
+def trim_silence(audio, silence_thresh=-50, min_silence_len=10):
+    """
+    Срезает тишину в начале и в конце клипа - паузы между клипами потом задаются явно
+    
+    Args:
+        audio: AudioSegment
+        silence_thresh: порог тишины, dBFS
+        min_silence_len: шаг точности границы, мс
+    
+    Returns:
+        Новый AudioSegment (пустой, если клип целиком тихий)
+    """
+    silence_parts = detect_silence(audio, min_silence_len=min_silence_len, silence_thresh=silence_thresh)
+    start, end = 0, len(audio)
+    if silence_parts and silence_parts[0][0] == 0:
+        start = silence_parts[0][1]
+    if silence_parts and silence_parts[-1][1] == end:
+        end = silence_parts[-1][0]
+    return audio[start:max(start, end)]
+
+
+def mux_audio(video_path, audio_path, output_path, audio_codec="copy", ffmpeg=FFMPEG_BINARY):
+    """
+    Кладет новую аудиодорожку к видео без перекодирования картинки: видеопоток копируется
+    как есть (-c:v copy), звук из исходного файла отбрасывается. Длина дорожки должна совпадать
+    с длиной видео: -shortest при копировании режет по ключевым кадрам, поэтому не используется
+    
+    Args:
+        video_path: исходное видео
+        audio_path: новая аудиодорожка (для mp4 - уже в AAC, тогда audio_codec="copy")
+        output_path: путь для результата, контейнер - по расширению
+        audio_codec: кодек звука для ffmpeg, "copy" - без перекодирования
+        ffmpeg: путь к ffmpeg
+    
+    Returns:
+        output_path
+    
+    Raises:
+        subprocess.CalledProcessError: ffmpeg не смог собрать файл (например, видеокодек
+            не помещается в выходной контейнер)
+        FileNotFoundError: ffmpeg не найден
+    """
+    command = [
+        ffmpeg, "-y", "-v", "error",
+        "-i", video_path, "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", "copy", "-c:a", audio_codec,
+        output_path,
+    ]
+    subprocess.run(command, check=True, stdin=subprocess.DEVNULL, capture_output=True)
+    return output_path
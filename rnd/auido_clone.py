@@ -1,13 +1,17 @@
 import os
 import random
+import subprocess
 from tempfile import NamedTemporaryFile
-from gtts import gTTS
 from pydub import AudioSegment
 from pydub.effects import speedup
-from pydub.silence import detect_silence, split_on_silence
+from pydub.silence import split_on_silence
+from moviepy.config import get_setting
 from moviepy.editor import VideoFileClip, AudioFileClip, CompositeAudioClip, AudioClip
+from audio_tools import compact_pauses, detect_silence, mux_audio
+from tts_cache import GTTSEngine, synthesize
 
-def generate_continuous_funny_voice(text, output_path, speed_factor=1.5):
+def generate_continuous_funny_voice(text, output_path, speed_factor=1.5,
+                                    min_silence_len=150, silence_thresh=-40, seek_step=1):
     """
     Генерирует смешной женский голос без пауз между предложениями
     
@@ -15,50 +19,26 @@ def generate_continuous_funny_voice(text, output_path, speed_factor=1.5):
         text: текст для озвучки
         output_path: путь для сохранения аудио файла
         speed_factor: множитель скорости (>1 - быстрее и выше, <1 - медленнее и ниже)
+        min_silence_len: пауза короче этого (мс) не вырезается
+        silence_thresh: порог тишины, dBFS
+        seek_step: шаг поиска тишины, мс
     
     Returns:
         Путь к созданному аудио файлу
     """
     try:
-        # Создаем временный файл для полного текста
-        temp_file = NamedTemporaryFile(delete=False, suffix='.mp3')
-        temp_file.close()
-        
         print("Генерация голоса...")
-        # Генерируем голос для всего текста
-        tts = gTTS(text=text, lang='ru', slow=False)
-        tts.save(temp_file.name)
-        
-        # Загружаем аудио
-        audio = AudioSegment.from_mp3(temp_file.name)
+        # Озвучиваем по предложениям, уже озвученные фразы берутся из кэша
+        audio = synthesize(text, lang='ru', engine=GTTSEngine())
         
         print("Удаление всех пауз...")
-        # Находим все участки тишины длиннее 150 мс
-        silence_parts = detect_silence(audio, min_silence_len=150, silence_thresh=-40)
+        # Находим все участки тишины длиннее min_silence_len
+        silence_parts = detect_silence(audio, min_silence_len=min_silence_len,
+                                       silence_thresh=silence_thresh, seek_step=seek_step)
         
-        # Создаем новое аудио без пауз
-        continuous_audio = AudioSegment.empty()
-        last_end = 0
-        
-        # Если нет пауз, используем оригинальное аудио
-        if not silence_parts:
-            continuous_audio = audio
-        else:
-            # Обрабатываем каждый участок тишины
-            for start, end in silence_parts:
-                # Добавляем аудио до тишины
-                if start > last_end:
-                    continuous_audio += audio[last_end:start]
-                
-                # Добавляем очень короткую паузу вместо длинной
-                # (полностью удалять паузы нельзя, иначе слова будут сливаться)
-                continuous_audio += AudioSegment.silent(duration=10)
-                
-                last_end = end
-            
-            # Добавляем оставшуюся часть аудио после последней паузы
-            if last_end < len(audio):
-                continuous_audio += audio[last_end:]
+        # Склеиваем аудио без пауз, оставляя очень короткую паузу вместо длинной
+        # (полностью удалять паузы нельзя, иначе слова будут сливаться)
+        continuous_audio = compact_pauses(audio, silence_parts, pause_ms=10)
         
         print("Применение эффектов смешного голоса...")
         # Изменяем скорость (делает голос выше и быстрее)
@@ -67,22 +47,16 @@ def generate_continuous_funny_voice(text, output_path, speed_factor=1.5):
         # Сохраняем измененный звук
         funny_sound.export(output_path, format="mp3")
         
-        # Удаляем временный файл
-        if os.path.exists(temp_file.name):
-            os.unlink(temp_file.name)
-        
         return output_path
         
     except Exception as e:
         print(f"Ошибка при создании голоса: {e}")
         import traceback
         traceback.print_exc()
-        # Удаляем временный файл в случае ошибки
-        if os.path.exists(temp_file.name):
-            os.unlink(temp_file.name)
         return None
 
-def replace_audio_with_voice_on_segments(video_path, text, num_segments=3, force_start_at_beginning=True):
+def replace_audio_with_voice_on_segments(video_path, text, num_segments=3, force_start_at_beginning=True,
+                                         output_mode="copy"):
     """
     Удаляет исходную аудиодорожку и накладывает смешной женский голос 
     на случайные отрывки видео, оставляя остальные отрывки без звука.
@@ -93,6 +67,8 @@ def replace_audio_with_voice_on_segments(video_path, text, num_segments=3, force
         text: текст для озвучки
         num_segments: количество случайных отрывков для наложения голоса
         force_start_at_beginning: начинать первый сегмент с начала видео
+        output_mode: "copy" - отдельно кодируется только звук, видеопоток копируется без изменений;
+            "reencode" - полное перекодирование через moviepy (и запасной вариант для "copy")
     
     Returns:
         Путь к новому видео
@@ -214,23 +190,42 @@ def replace_audio_with_voice_on_segments(video_path, text, num_segments=3, force
             audio_parts.append(silence)
         
         # Создаем итоговую аудиодорожку
-        final_audio = CompositeAudioClip(audio_parts)
-        
-        # Добавляем аудио к видео
-        final_video = video.set_audio(final_audio)
+        final_audio = CompositeAudioClip(audio_parts).set_duration(video_duration)
         
         # Создаем имя для выходного файла
         output_path = os.path.splitext(video_path)[0] + "_continuous_voice.mp4"
         
         # Сохраняем результат
         print(f"Сохранение результата в {output_path}")
-        final_video.write_videofile(output_path, codec='libx264', audio_codec='aac')
+        muxed = False
+        if output_mode == "copy":
+            # Кодируем только звук, картинку переносим из исходника без перекодирования
+            track_file = NamedTemporaryFile(delete=False, suffix='.m4a')
+            track_file.close()
+            try:
+                final_audio.write_audiofile(track_file.name, fps=44100, codec='aac', logger=None)
+                mux_audio(video_path, track_file.name, output_path, ffmpeg=get_setting('FFMPEG_BINARY'))
+                muxed = True
+            except (OSError, subprocess.CalledProcessError) as e:
+                stderr = getattr(e, 'stderr', None)
+                details = stderr.decode(errors='replace').strip() if stderr else e
+                print(f"Не удалось собрать видео без перекодирования ({details}), перекодируем через moviepy")
+            finally:
+                if os.path.exists(track_file.name):
+                    os.unlink(track_file.name)
+        
+        final_video = None
+        if not muxed:
+            # Добавляем аудио к видео и перекодируем целиком
+            final_video = video.set_audio(final_audio)
+            final_video.write_videofile(output_path, codec='libx264', audio_codec='aac')
         
         # Закрываем все клипы
         video.close()
         voice_audio.close()
         final_audio.close()
-        final_video.close()
+        if final_video is not None:
+            final_video.close()
         
         # Удаляем временный файл с голосом
         if os.path.exists(voice_file.name):
@@ -123,23 +123,18 @@ def setup_environment():
     
     return wav2lip_dir
 
-def text_to_speech_with_voice_cloning(text, output_file, reference_audio, language='ru'):
+def text_to_speech_with_voice_cloning(text, output_file, reference_audio, language='ru', workers=0):
     """Convert text to speech using TTS with voice cloning"""
     print(f"Generating speech with voice cloning...")
     
     try:
-        from TTS.api import TTS
+        from tts_cache import XTTSEngine, synthesize_to_file
         
-        # Initialize TTS with the voice cloning model
-        print("Loading XTTS model for voice cloning...")
-        tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2")
-        
-        # Generate speech with voice cloning
+        # Generate speech with voice cloning: sentences are synthesized in parallel
+        # (one XTTS model per worker process) and joined with even pauses
         print(f"Generating speech using reference audio: {reference_audio}")
-        tts.tts_to_file(text=text, 
-                        file_path=output_file,
-                        speaker_wav=reference_audio,
-                        language=language)
+        synthesize_to_file(text, output_file, lang=language, engine=XTTSEngine(reference_audio),
+                           gap_ms=250, trim_thresh=-50, workers=workers)
         
         print(f"Speech with cloned voice saved to {output_file}")
         return output_file
@@ -153,9 +148,9 @@ def text_to_speech_basic(text, output_file, language='en'):
     """Convert text to speech using gTTS (fallback)"""
     print(f"Generating speech from text in {language} using gTTS (fallback)...")
     try:
-        from gtts import gTTS
-        tts = gTTS(text=text, lang=language, slow=False)
-        tts.save(output_file)
+        from tts_cache import GTTSEngine, synthesize_to_file
+        # по предложениям, через кэш: повторяющиеся фразы не озвучиваются заново
+        synthesize_to_file(text, output_file, lang=language, engine=GTTSEngine())
         print(f"Speech saved to {output_file}")
         return output_file
     except Exception as e:
@@ -222,6 +217,7 @@ def main():
     
     parser.add_argument("--output", required=True, help="Output video file")
     parser.add_argument("--language", default="ru", help="Language code for TTS (default: ru)")
+    parser.add_argument("--tts-workers", type=int, default=0, help="XTTS worker processes, each loads its own model (default: TTS_PROCESS_WORKERS, 2)")
     parser.add_argument("--reference-audio", help="Optional: Path to reference audio file for voice cloning. If not provided, audio will be extracted from the input video.")
     args = parser.parse_args()
     
@@ -261,7 +257,8 @@ def main():
         
         # Generate speech from text with voice cloning
         temp_audio = os.path.join(temp_dir, "temp_audio.wav")
-        audio_file = text_to_speech_with_voice_cloning(text_content, temp_audio, reference_audio, language=args.language)
+        audio_file = text_to_speech_with_voice_cloning(text_content, temp_audio, reference_audio, language=args.language,
+                                                       workers=args.tts_workers)
         
         # Enhance audio quality
         enhanced_audio = os.path.join(temp_dir, "enhanced_audio.wav")
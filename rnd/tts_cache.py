@@ -0,0 +1,313 @@
+"""
+Синтез речи по предложениям с кэшем на диске: каждое предложение озвучивается один раз
+для (текст, язык, движок, скорость), повторяющиеся фразы ведущего берутся из кэша.
+Движки подключаемые: gTTS, XTTS (клонирование голоса) и офлайн-заглушка для проверок без сети.
+Недостающие предложения синтезируются параллельно: сетевые движки в потоках, XTTS - в процессах
+"""
+import abc
+import hashlib
+import json
+import os
+import re
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+from pydub import AudioSegment
+
+from audio_tools import join_segments, trim_silence
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(ROOT_DIR, "data", "tts_cache"))
+TTS_CACHE_SIZE = int(os.getenv("TTS_CACHE_SIZE", str(512 * 1024 * 1024)))
+# сколько предложений синтезировать одновременно, 0 - по умолчанию движка:
+# для потоков - по числу ядер, для процессов - TTS_PROCESS_WORKERS
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "0"))
+# каждый процесс держит свою модель (XTTS - около 2 ГБ) и сам грузит ядра, поэтому их немного
+TTS_PROCESS_WORKERS = int(os.getenv("TTS_PROCESS_WORKERS", "2"))
+
+# конец предложения: . ! ? … (в том числе несколько подряд) и пробел после
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def split_sentences(text):
+    """
+    Делит текст на предложения, пробелы внутри предложения схлопываются -
+    одинаковые фразы дают одинаковый ключ кэша
+    """
+    sentences = (" ".join(part.split()) for part in SENTENCE_END.split(text.strip()))
+    return [sentence for sentence in sentences if sentence]
+
+
+class TTSEngine(abc.ABC):
+    """
+    Интерфейс движка синтеза: synthesize пишет озвучку text в файл path формата extension.
+    pool - где параллелить синтез: "thread" для движков, которые ждут сеть или отпускают GIL,
+    "process" для тех, что упираются в CPU под GIL
+    """
+    name = "base"
+    extension = "wav"
+    pool = "thread"
+
+    @property
+    def cache_id(self):
+        """
+        Все, кроме текста, языка и скорости, от чего зависит звук (модель, голос)
+        """
+        return self.name
+
+    @abc.abstractmethod
+    def synthesize(self, text, path, lang, speed):
+        """
+        Озвучивает text на языке lang со скоростью speed и сохраняет в path
+        """
+
+
+class GTTSEngine(TTSEngine):
+    """
+    Google TTS через gTTS, нужна сеть. Скорость - только обычная или медленная (speed < 1)
+    """
+    name = "gtts"
+    extension = "mp3"
+
+    def synthesize(self, text, path, lang, speed):
+        from gtts import gTTS
+        gTTS(text=text, lang=lang, slow=speed < 1).save(path)
+
+
+@lru_cache(maxsize=None)
+def _xtts_model(model_name):
+    # одна модель на процесс: в пуле процессов каждый воркер загружает ее при первом синтезе
+    from TTS.api import TTS
+    print("Loading XTTS model for voice cloning...")
+    return TTS(model_name)
+
+
+class XTTSEngine(TTSEngine):
+    """
+    XTTS v2 из Coqui TTS с клонированием голоса по reference_audio.
+    Модель загружается при первом синтезе, в каждом процессе пула своя
+    """
+    name = "xtts"
+    extension = "wav"
+    pool = "process"
+
+    def __init__(self, reference_audio, model_name="tts_models/multilingual/multi-dataset/xtts_v2"):
+        self.reference_audio = reference_audio
+        self.model_name = model_name
+        self._cache_id = None
+
+    @property
+    def cache_id(self):
+        # голос задается содержимым референса, а не путем к нему
+        if self._cache_id is None:
+            with open(self.reference_audio, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()[:16]
+            self._cache_id = f"{self.name}:{self.model_name}:{digest}"
+        return self._cache_id
+
+    def synthesize(self, text, path, lang, speed):
+        _xtts_model(self.model_name).tts_to_file(text=text, file_path=path, speaker_wav=self.reference_audio,
+                                language=lang, speed=speed)
+
+
+class StubEngine(TTSEngine):
+    """
+    Офлайн-заглушка: тон, длина которого пропорциональна длине текста.
+    Детерминирована, поэтому годится для проверки кэша и склейки без сети.
+    latency - имитация времени ответа сервиса на одно предложение, с
+    """
+    name = "stub"
+    extension = "wav"
+
+    def __init__(self, frame_rate=24000, ms_per_char=60, latency=0.0):
+        self.frame_rate = frame_rate
+        self.ms_per_char = ms_per_char
+        self.latency = latency
+
+    def synthesize(self, text, path, lang, speed):
+        if self.latency:
+            time.sleep(self.latency)
+        frames = int(len(text) * self.ms_per_char / speed * self.frame_rate / 1000)
+        frequency = 200 + int(hashlib.md5(f"{lang}:{text}".encode("utf-8")).hexdigest()[:4], 16) % 300
+        t = np.arange(frames) / self.frame_rate
+        samples = (0.3 * 32767 * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+        with wave.open(path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(self.frame_rate)
+            f.writeframes(samples.tobytes())
+
+
+class TTSCache:
+    """
+    Клипы отдельных предложений на диске, имя файла - sha256 от (текст, язык, движок, скорость).
+    Время последнего обращения - mtime файла, при превышении max_size удаляются самые старые
+    """
+    def __init__(self, cache_dir=TTS_CACHE_DIR, max_size=TTS_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text, lang, engine, speed):
+        payload = json.dumps([text, lang, engine.cache_id, float(speed)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key, extension):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{extension}")
+
+    def get(self, key, extension):
+        """
+        Путь к клипу из кэша или None
+        """
+        path = self.path(key, extension)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def put(self, key, engine, text, lang, speed):
+        """
+        Синтезирует клип во временный файл и атомарно кладет его в кэш
+        """
+        path = self.path(key, engine.extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path[:-len(engine.extension) - 1]}.{os.getpid()}.tmp.{engine.extension}"
+        try:
+            engine.synthesize(text, tmp_path, lang, speed)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+
+    def evict(self):
+        entries = []
+        total = 0
+        if not os.path.isdir(self.cache_dir):
+            return
+        for bucket in os.scandir(self.cache_dir):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if ".tmp." in entry.name:
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            os.remove(path)
+            total -= size
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+# Общий кэш для скриптов rnd
+tts_cache = TTSCache()
+
+
+def _limit_threads(threads):
+    # ядра делятся между процессами пула, иначе torch в каждом занимает все
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def _default_workers(engine):
+    if engine.pool == "process":
+        return TTS_PROCESS_WORKERS
+    return os.cpu_count() or 1
+
+
+def _make_executor(engine, workers):
+    if engine.pool == "process":
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        return ProcessPoolExecutor(workers, initializer=_limit_threads, initargs=(threads,))
+    return ThreadPoolExecutor(workers, thread_name_prefix="tts")
+
+
+def synthesize(text, lang="ru", engine=None, speed=1.0, cache=None, gap_ms=0,
+               trim_thresh=None, workers=TTS_WORKERS, executor=None):
+    """
+    Озвучивает текст по предложениям: готовые клипы берутся из кэша, недостающие синтезируются
+    параллельно и склеиваются в исходном порядке
+
+    Args:
+        text: текст для озвучки
+        lang: язык
+        engine: движок синтеза, по умолчанию gTTS
+        speed: скорость речи движка
+        cache: кэш клипов, по умолчанию общий tts_cache
+        gap_ms: пауза между предложениями, мс
+        trim_thresh: если задан (dBFS), тишина по краям клипов срезается и между предложениями
+            остается ровно gap_ms
+        workers: сколько предложений синтезировать одновременно, 0 - по умолчанию движка
+            (потоки - по числу ядер, процессы - TTS_PROCESS_WORKERS), 1 - по очереди
+        executor: готовый пул (например, с уже загруженными моделями), тогда workers не используется
+
+    Returns:
+        AudioSegment со всем текстом
+    """
+    engine = engine or GTTSEngine()
+    cache = cache or tts_cache
+    sentences = split_sentences(text)
+    keys = [cache.key(sentence, lang, engine, speed) for sentence in sentences]
+    paths = {}
+    missing = {}
+    for key, sentence in zip(keys, sentences):
+        if key in paths or key in missing:
+            continue
+        path = cache.get(key, engine.extension)
+        if path is None:
+            # повтор фразы в этом же тексте синтезируется один раз
+            missing[key] = sentence
+        else:
+            paths[key] = path
+
+    workers = min(workers or _default_workers(engine), len(missing))
+    if executor is None and workers <= 1:
+        for key, sentence in missing.items():
+            paths[key] = cache.put(key, engine, sentence, lang, speed)
+    elif missing:
+        pool = executor or _make_executor(engine, workers)
+        try:
+            futures = {key: pool.submit(cache.put, key, engine, sentence, lang, speed)
+                       for key, sentence in missing.items()}
+            for key, future in futures.items():
+                paths[key] = future.result()
+        finally:
+            if executor is None:
+                pool.shutdown(cancel_futures=True)
+
+    clips = [AudioSegment.from_file(paths[key], format=engine.extension) for key in keys]
+    if trim_thresh is not None:
+        clips = [trim_silence(clip, silence_thresh=trim_thresh) for clip in clips]
+    cache.evict()
+    return join_segments(clips, gap_ms)
+
+
+def synthesize_to_file(text, output_path, lang="ru", engine=None, speed=1.0, cache=None, gap_ms=0,
+                       trim_thresh=None, workers=TTS_WORKERS, executor=None):
+    """
+    То же, что synthesize, с сохранением в файл; формат - по расширению output_path
+    """
+    audio = synthesize(text, lang=lang, engine=engine, speed=speed, cache=cache, gap_ms=gap_ms,
+                       trim_thresh=trim_thresh, workers=workers, executor=executor)
+    audio.export(output_path, format=os.path.splitext(output_path)[1].lstrip(".") or "wav")
+    return output_path